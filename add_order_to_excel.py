@@ -1,5 +1,12 @@
-import pandas as pd
+import argparse
+import sys
+
+import numpy as np
 import openpyxl
+import pandas as pd
+
+# CONTENT_ITEMS 中由 assign_content_order 產生的欄位
+CONTENT_ORDER_COLUMNS = ('seq', 'pushOrder')
 
 def add_order_column(excel_path):
     """在 PRODUCTS sheet 中添加 order 欄位"""
@@ -65,12 +72,148 @@ def add_order_column(excel_path):
     
     return df_sorted
 
-if __name__ == '__main__':
-    excel_path = 'learning_bubble_upload_ready_v2_all_fixed.xlsx'
+def content_sort_key(df):
+    """CONTENT_ITEMS 的排序鍵：試讀在前、由淺到深、同一個 anchorGroup 排在一起
+
+    anchorGroup 依它在產品內第一次出現的位置排序，保留編輯原本的分組順序。
+    """
+    def column(name, default):
+        return df[name] if name in df.columns else pd.Series(default, index=df.index)
+
+    product = df['productId'].astype(str).str.strip()
+    preview = column('isPreview', False).astype(str).str.strip().str.lower().isin(('true', '1', '1.0', 'yes', 'y'))
+    difficulty = pd.to_numeric(column('difficulty', 1), errors='coerce').fillna(1)
+    anchor = column('anchorGroup', '').fillna('')
+    position = pd.Series(np.arange(len(df)), index=df.index)
+    return pd.DataFrame({
+        'productId': product,
+        'preview': ~preview,
+        'difficulty': difficulty,
+        'anchor': position.groupby([product, anchor]).transform('min'),
+        'position': position,
+    }, index=df.index)
+
+
+def assign_order_column(values, key, renumber=False):
+    """依 key 的順序，替每個產品產生 1..n 的不重複編號
+
+    key 的欄位即排序順序（productId 在最前、position 在最後），既有編號排在 position 之前。
+
+    已有的編號只要是 1..n 之間的整數、且在產品內沒有重複，就原樣保留；
+    其餘（空白、非數字、重複、超出範圍）依排序鍵依序填入還沒被使用的最小號碼。
+    renumber=True 時不保留既有編號，整個產品依排序鍵重新編 1..n。
+    """
+    existing = pd.to_numeric(values, errors='coerce')
+    columns = [c for c in key.columns if c != 'position'] + ['existing', 'position']
+    key = key.assign(existing=existing.fillna(np.inf))
+    order = key.sort_values(columns, kind='stable').index
+
+    product = key.loc[order, 'productId'].to_numpy()
+    current = existing.loc[order].to_numpy()
+    codes, uniques = pd.factorize(product)
+    counts = np.bincount(codes)
+    size = counts[codes]
+
+    if renumber:
+        valid = np.zeros(len(order), dtype=bool)
+    else:
+        in_range = (current >= 1) & (current <= size) & (np.floor(current) == current)
+        duplicated = pd.DataFrame({'product': codes, 'value': current}).duplicated().to_numpy()
+        valid = in_range & ~duplicated
+
+    # 每個產品的 1..n 中，沒有被合法編號佔用的號碼（依產品、號碼排序）
+    slot_product = np.repeat(np.arange(len(counts)), counts)
+    slot_number = np.arange(len(product)) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+    width = int(counts.max(initial=0)) + 1
+    taken = codes[valid] * width + current[valid].astype(np.int64)
+    free_numbers = slot_number[~np.isin(slot_product * width + slot_number, taken)]
+
+    # 不合法的列依排序順序，對應到同一產品中依序的空號
+    result = np.where(valid, np.nan_to_num(current), 0).astype(np.int64)
+    result[~valid] = free_numbers
+    return pd.Series(result, index=order).reindex(values.index)
+
+
+def assign_content_order(df, renumber=False):
+    """計算 CONTENT_ITEMS 的 seq / pushOrder，回傳 (新的 DataFrame, {欄位: 變動列數})
+
+    兩欄要維持相同的順序（pushOrder 在 App 中顯示為 Day N）：先編 seq，seq 空白時沿用
+    該列的 pushOrder；pushOrder 空白或不合法的列再依編好的 seq 排序補號。
+    """
+    out = df.copy()
+    key = content_sort_key(df)
+    changed = {}
+    for col in CONTENT_ORDER_COLUMNS:
+        values = df[col] if col in df.columns else pd.Series(np.nan, index=df.index)
+        source = values
+        if col == 'seq' and 'pushOrder' in df.columns:
+            source = pd.to_numeric(values, errors='coerce').fillna(pd.to_numeric(df['pushOrder'], errors='coerce'))
+        assigned = assign_order_column(source, key, renumber)
+        if col == 'seq':
+            key = key[['productId']].assign(seq=assigned, position=key['position'])
+        before = pd.to_numeric(values, errors='coerce')
+        changed[col] = int((before != assigned).sum())
+        out[col] = assigned
+    return out, changed
+
+
+def add_content_order(excel_path, renumber=False):
+    """在 CONTENT_ITEMS sheet 中產生 seq / pushOrder
+
+    直接以 openpyxl 改寫有變動的儲存格，其他 sheet、格式、下拉選單與標題註解都不動；
+    productId 空白的列不編號。
+    """
+    wb = openpyxl.load_workbook(excel_path)
+    ws = wb['CONTENT_ITEMS']
+    header = [c.value if c.value is not None else f'_{i}' for i, c in enumerate(ws[1])]
+    df = pd.DataFrame(list(ws.iter_rows(min_row=2, max_col=len(header), values_only=True)), columns=header)
+    df.index = df.index + 2  # Excel 列號
+    df = df[df['productId'].notna() & (df['productId'].astype(str).str.strip() != '')]
+
+    df_sorted, changed = assign_content_order(df, renumber)
+    for col in CONTENT_ORDER_COLUMNS:
+        if col not in header:
+            header.append(col)
+            ws.cell(row=1, column=len(header), value=col)
+        column = header.index(col) + 1
+        for row, value in df_sorted[col].items():
+            cell = ws.cell(row=row, column=column)
+            if cell.value != value:
+                cell.value = int(value)
+    if any(changed.values()):
+        wb.save(excel_path)
+
+    print(f'\n📊 更新後的 CONTENT_ITEMS sheet:')
+    print(f'   總行數: {len(df_sorted)}，產品數: {df_sorted["productId"].nunique()}')
+    for col, count in changed.items():
+        print(f'   {col}: {count} 列變動')
+
+    return df_sorted
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='在 PRODUCTS sheet 中添加 order 欄位（--content 改為產生 CONTENT_ITEMS 的 seq / pushOrder）')
+    ap.add_argument('excel', help='xlsx path')
+    ap.add_argument('--content', action='store_true', help='only assign seq / pushOrder in CONTENT_ITEMS (PRODUCTS is left untouched)')
+    ap.add_argument('--renumber', action='store_true', help='with --content, renumber every item instead of keeping valid values')
+    args = ap.parse_args(argv)
+
+    excel_path = args.excel
+    if args.renumber and not args.content:
+        ap.error('--renumber requires --content')
     try:
-        df = add_order_column(excel_path)
-        print(f'\n✅ 完成！已成功添加 order 欄位到 {excel_path}')
+        if args.content:
+            add_content_order(excel_path, args.renumber)
+            print(f'\n✅ 完成！已產生 CONTENT_ITEMS 的 seq / pushOrder')
+        else:
+            add_order_column(excel_path)
+            print(f'\n✅ 完成！已成功添加 order 欄位到 {excel_path}')
     except Exception as e:
         print(f'❌ 錯誤: {e}')
         import traceback
         traceback.print_exc()
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from upload_v3_excel import attach_previews, connect_firestore, empty_catalog, parse_workbook, report_quarantine, sync_previews, upload_catalog
+
+
+def list_workbooks(directory):
+    """列出資料夾內所有 xlsx（略過 Excel 開檔時產生的 ~$ 暫存檔）"""
+    files = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("~$") or not name.lower().endswith(".xlsx"):
+            continue
+        files.append(os.path.join(directory, name))
+    return files
+
+
+def parse_with_quarantine(path):
+    """在子行程中解析一份 Excel；隔離的列在 sheet 前加上檔名"""
+    quarantine = []
+    catalog = parse_workbook(path, quarantine=quarantine)
+    for q in quarantine:
+        q["sheet"] = f"{os.path.basename(path)}:{q['sheet']}"
+    return catalog, quarantine
+
+
+def parse_workbooks(files, workers=None):
+    """平行解析多份 Excel，回傳 ([(檔名, catalog)], quarantine)，順序與 files 相同"""
+    parsed = []
+    quarantine = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, (catalog, rows) in zip(files, pool.map(parse_with_quarantine, files)):
+            parsed.append((path, catalog))
+            quarantine.extend(rows)
+    return parsed, quarantine
+
+
+def merge_catalogs(parsed):
+    """合併多份 catalog，並找出同一個 id 在不同檔案中內容不一致的列
+
+    回傳 (merged, sources, conflicts)：
+      merged    : 合併後的 catalog（同 id 以最後一份檔案為準）
+      sources   : {集合: {docId: [檔名, ...]}}
+      conflicts : [(集合, docId, [(檔名, data), ...])]
+    """
+    merged = empty_catalog()
+    sources = {name: {} for name in merged}
+    versions = {name: {} for name in merged}
+
+    for path, catalog in parsed:
+        for name, docs in catalog.items():
+            for doc_id, data in docs.items():
+                merged[name][doc_id] = data
+                sources[name].setdefault(doc_id, []).append(path)
+                versions[name].setdefault(doc_id, []).append((path, data))
+
+    conflicts = []
+    for name, docs in versions.items():
+        for doc_id, entries in docs.items():
+            first = entries[0][1]
+            if any(data != first for _, data in entries[1:]):
+                conflicts.append((name, doc_id, entries))
+    return merged, sources, conflicts
+
+
+def resolve_conflicts(merged, conflicts, strategy):
+    """依策略決定衝突列採用哪份檔案（merged 預設已是 last）"""
+    if strategy == "first":
+        for name, doc_id, entries in conflicts:
+            merged[name][doc_id] = entries[0][1]
+    return merged
+
+
+def print_conflicts(conflicts):
+    for name, doc_id, entries in conflicts:
+        first = entries[0][1]
+        fields = set()
+        for _, data in entries[1:]:
+            for key in set(first) | set(data):
+                if first.get(key) != data.get(key):
+                    fields.add(key)
+        files = ", ".join(os.path.basename(path) for path, _ in entries)
+        print(f"   ⚠️  {name}/{doc_id}: {files}")
+        print(f"      不一致欄位: {', '.join(sorted(fields))}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--key", help="service account json path")
+    ap.add_argument("--dir", required=True, help="directory containing xlsx workbooks")
+    ap.add_argument("--emulator", help="Firestore emulator host:port (no key needed)")
+    ap.add_argument("--workers", type=int, default=None, help="parallel parse processes (default: CPU count)")
+    ap.add_argument("--on-conflict", choices=("abort", "first", "last"), default="abort",
+                    help="how to handle the same id with different content across workbooks")
+    ap.add_argument("--dry-run", action="store_true", help="parse and merge only, do not upload")
+    ap.add_argument("--max-errors", type=int, default=0, help="abort only if more than this many rows fail to convert")
+    ap.add_argument("--quarantine-report", help="csv path for rows that failed to convert (default: <dir>/quarantine.csv)")
+    args = ap.parse_args(argv)
+
+    if not args.dry_run and not args.key and not args.emulator:
+        ap.error("--key is required unless --emulator or --dry-run is given")
+
+    files = list_workbooks(args.dir)
+    if not files:
+        print(f"❌ 錯誤: {args.dir} 中找不到 xlsx 檔案")
+        sys.exit(1)
+
+    print(f"📖 平行解析 {len(files)} 份 Excel ...")
+    parsed, quarantine = parse_workbooks(files, args.workers)
+    report_path = args.quarantine_report or os.path.join(args.dir, "quarantine.csv")
+    if not report_quarantine(quarantine, report_path, args.max_errors):
+        sys.exit(1)
+    merged, sources, conflicts = merge_catalogs(parsed)
+
+    for name, docs in merged.items():
+        shared = sum(1 for paths in sources[name].values() if len(paths) > 1)
+        print(f"   {name}: {len(docs)} 筆（{shared} 筆出現在多份檔案）")
+
+    if conflicts:
+        print(f"\n❌ 發現 {len(conflicts)} 筆衝突（同 id 不同內容）:")
+        print_conflicts(conflicts)
+        if args.on_conflict == "abort":
+            print("\n❌ 已中止上傳，請修正衝突或使用 --on-conflict first/last")
+            sys.exit(1)
+        merged = resolve_conflicts(merged, conflicts, args.on_conflict)
+        print(f"\n⚠️  依 --on-conflict {args.on_conflict} 處理衝突")
+    # 試讀卡片要在合併後才算，產品與它的 content 可能來自不同檔案
+    attach_previews(merged)
+
+    if args.dry_run:
+        print("\n⏭️  --dry-run：不上傳")
+        return
+
+    db = connect_firestore(args.key, args.emulator)
+    upload_catalog(db, merged)
+    sync_previews(db, merged["content_items"], merged["products"])
+
+    print(f"✅ Batch upload done: {len(files)} 份 Excel 合併後一次上傳")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Learning Bubbles 內容工具統一入口
+
+    python3 bubble_cli.py <command> [args...]
+    python3 bubble_cli.py <command> --help
+
+子命令的模組都在執行時才 import：`--help` 不會載入 pandas，validate / order /
+template / compile / export / dedup / simulate 不會載入 firebase_admin。bench 會檢查這些限制有沒有被破壞。
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+# 子命令 -> (模組, 說明)；模組都有 main(argv) 並回傳 exit code
+COMMANDS = {
+    "validate": ("check_excel_structure", "檢查 Excel 結構是否符合上傳要求"),
+    "order": ("add_order_to_excel", "在 PRODUCTS 中產生 order 欄位"),
+    "template": ("create_blank_excel_template", "產生空白 Excel 模板"),
+    "compile": ("compile_catalog", "把 Excel 編譯成 Arrow + manifest 的 catalog，或比對兩個版本"),
+    "upload": ("upload_v3_excel", "上傳到 Firestore（--dir 批次上傳多份、--watch 存檔即重新發布）"),
+    "export": ("export_catalog", "把 Excel 轉成上傳用的文件並輸出 JSON"),
+    "dedup": ("dedup_content", "找出完全相同與高度相似的 content"),
+    "simulate": ("push_simulator", "模擬推播排程的發送量與內容消耗速度"),
+    "loadtest": ("load_test_catalog", "對 Firestore 模擬器重播 app 的讀取模式，量測延遲與讀取量"),
+    "bench": (None, "量測各子命令的啟動時間並檢查延遲載入"),
+}
+
+# upload 的變體：出現這些參數時改用對應的模組
+UPLOAD_VARIANTS = {
+    "--dir": "batch_upload_excel",
+    "--watch": "watch_upload_excel",
+}
+
+# 不需要連線的子命令不能載入的模組
+FIREBASE_MODULES = ("firebase_admin", "google.cloud.firestore")
+OFFLINE_COMMANDS = ("validate", "order", "template", "compile", "export", "dedup", "simulate")
+
+# bench 的預算（毫秒）；--help 包含直譯器啟動，其餘為載入子命令模組的時間
+BENCH_BUDGETS_MS = {
+    "--help": 150,
+    "validate": 2500,
+    "order": 2500,
+    "template": 500,  # 只用 openpyxl write-only，不載入 pandas
+    "compile": 2500,
+    "export": 2500,
+    "dedup": 2500,
+    "simulate": 2500,
+    "upload": 2500,
+    "loadtest": 2500,
+}
+
+# 在乾淨的子行程中量測載入時間，避免受目前行程已載入的模組影響
+BENCH_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import bubble_cli
+bubble_cli.load_command(sys.argv[1], [])
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({"ms": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+# 照 `python3 bubble_cli.py --help` 實際的路徑執行，結束後列出載入的模組
+BENCH_HELP_PROBE = """
+import contextlib, io, json, runpy, sys
+sys.argv = [sys.argv[1], "--help"]
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        runpy.run_path(sys.argv[0], run_name="__main__")
+    except SystemExit:
+        pass
+print(json.dumps(sorted(sys.modules)))
+"""
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def resolve_module(command, argv):
+    module = COMMANDS[command][0]
+    if command == "upload":
+        for flag, variant in UPLOAD_VARIANTS.items():
+            if flag in argv:
+                module = variant
+    return module
+
+
+def load_command(command, argv):
+    """import 子命令的模組並回傳它的 main"""
+    return importlib.import_module(resolve_module(command, argv)).main
+
+
+def run_probe(args):
+    # 在腳本所在的資料夾執行，probe 才 import 得到 bubble_cli 與各子命令模組
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable] + args, capture_output=True, text=True, check=True, cwd=HERE).stdout
+    return (time.perf_counter() - started) * 1000, out
+
+
+def bench(argv):
+    ap = argparse.ArgumentParser(prog="bubble_cli.py bench", description=COMMANDS["bench"][1])
+    ap.add_argument("--repeat", type=int, default=3, help="runs per command, the fastest one is reported")
+    ap.add_argument("--budget-scale", type=float, default=1.0, help="multiply every budget, e.g. for slow CI machines")
+    args = ap.parse_args(argv)
+
+    failures = []
+    print(f"{'command':<10} {'ms':>8} {'budget':>8}")
+    for command, budget in BENCH_BUDGETS_MS.items():
+        budget *= args.budget_scale
+        runs = []
+        loaded = set()
+        for _ in range(args.repeat):
+            if command == "--help":
+                script = os.path.join(HERE, "bubble_cli.py")
+                ms, _ = run_probe([script, "--help"])
+                # --help 不應該載入任何子命令模組，另外確認沒有 pandas
+                _, out = run_probe(["-c", BENCH_HELP_PROBE, script])
+                loaded |= {m for m in ("pandas", "openpyxl") + FIREBASE_MODULES if m in json.loads(out)}
+            else:
+                _, out = run_probe(["-c", BENCH_PROBE, command])
+                result = json.loads(out)
+                ms = result["ms"]
+                if command in OFFLINE_COMMANDS:
+                    loaded |= {m for m in FIREBASE_MODULES if m in result["modules"]}
+            runs.append(ms)
+
+        best = min(runs)
+        status = "✅"
+        if best > budget:
+            status = "❌"
+            failures.append(f"{command}: {best:.0f}ms > {budget:.0f}ms")
+        if loaded:
+            status = "❌"
+            failures.append(f"{command}: 不應載入 {', '.join(sorted(loaded))}")
+        print(f"{command:<10} {best:>8.0f} {budget:>8.0f} {status}")
+
+    if failures:
+        print("\n❌ 啟動時間退步:")
+        for failure in failures:
+            print(f"   {failure}")
+        return 1
+    print("\n✅ 所有子命令都在預算內")
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = "\n".join(f"  {name:<10} {help_text}" for name, (_, help_text) in COMMANDS.items())
+    ap = argparse.ArgumentParser(
+        prog="bubble_cli.py",
+        description="Learning Bubbles 內容工具",
+        epilog=f"commands:\n{commands}",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    ap.add_argument("command", choices=COMMANDS, metavar="command")
+    ap.add_argument("args", nargs=argparse.REMAINDER, help="arguments passed to the command")
+    args = ap.parse_args(argv[:1])
+    rest = argv[1:]
+
+    if args.command == "bench":
+        return bench(rest)
+    if args.command == "upload" and "--watch" in rest:
+        rest = [a for a in rest if a != "--watch"]
+        return load_command("upload", ["--watch"])(rest)
+    return load_command(args.command, rest)(rest) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,9 @@
-import pandas as pd
+import argparse
+import os
 import sys
 
+import pandas as pd
+
 def check_excel_structure(excel_file):
     """檢查 Excel 檔案結構是否符合上傳腳本要求"""
     
@@ -96,9 +99,92 @@ def check_excel_structure(excel_file):
         traceback.print_exc()
         return False
 
+# 編譯後的 catalog 中每個集合的必要欄位（上傳的文件欄位，不是 Excel 欄位名稱）
+REQUIRED_DOC_FIELDS = {
+    'segments': ['id', 'title', 'order', 'mode'],
+    'topics': ['title', 'order'],
+    'products': ['topicId', 'level', 'title', 'titleLower'],
+    'featured_lists': ['title'],
+    'content_items': ['productId', 'seq'],
+}
+
+def check_compiled_catalog(path, verify_hashes=False):
+    """檢查 compile_catalog.py 產生的資料夾；除了 verify_hashes 之外只讀 Arrow 欄位，不轉成文件"""
+    from compile_catalog import ID_COLUMN, load_catalog, read_manifest, read_table, row_hash
+    import pyarrow.compute as pc
+
+    print(f'📋 檢查已編譯的 catalog: {path}\n')
+    print('=' * 60)
+    try:
+        manifest = read_manifest(path)
+    except (OSError, ValueError) as e:
+        print(f'❌ 錯誤: {e}')
+        return False
+    print(f'\n✅ 版本 {manifest["version"]}（來源 {manifest["source"]}，編譯於 {manifest["compiledAt"]}）')
+
+    all_valid = True
+    for name, fields in REQUIRED_DOC_FIELDS.items():
+        print(f'\n📊 檢查集合: {name}')
+        print('-' * 60)
+        entity = manifest['entities'].get(name)
+        if entity is None:
+            print(f'❌ 錯誤: manifest 中缺少集合 "{name}"')
+            all_valid = False
+            continue
+        try:
+            table = read_table(path, name, manifest)
+        except OSError as e:
+            print(f'❌ 讀取失敗: {e}')
+            all_valid = False
+            continue
+        print(f'   文件數: {table.num_rows}')
+        if table.num_rows != entity['rows'] or table.num_rows != len(entity['rowHashes']):
+            print(f'❌ 文件數與 manifest 記錄的 {entity["rows"]} 不符')
+            all_valid = False
+        if table.num_rows and pc.count_distinct(table[ID_COLUMN]).as_py() != table.num_rows:
+            print('❌ 有重複的文件 id')
+            all_valid = False
+        if not table.num_rows:
+            continue
+        for field in fields:
+            if field not in table.column_names:
+                print(f'❌ 缺少必要欄位: {field}')
+                all_valid = False
+            elif table[field].null_count:
+                print(f'⚠️  {field}: {table[field].null_count} 筆資料為空')
+            else:
+                print(f'✅ {field}: 無空值')
+
+    if verify_hashes and all_valid:
+        catalog = load_catalog(path)
+        mismatched = [
+            f'{name}/{doc_id}'
+            for name, docs in catalog.items()
+            for doc_id, data in docs.items()
+            if row_hash(data) != manifest['entities'][name]['rowHashes'].get(doc_id)
+        ]
+        if mismatched:
+            print(f'\n❌ {len(mismatched)} 筆文件與 manifest 的雜湊不符: {", ".join(mismatched[:10])}')
+            all_valid = False
+        else:
+            print('\n✅ 所有文件都與 manifest 的雜湊相符')
+
+    print('\n' + '=' * 60)
+    if all_valid:
+        print('\n✅ 檢查完成：catalog 符合上傳要求！')
+    else:
+        print('\n❌ 檢查完成：發現問題，請重新編譯')
+    return all_valid
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='檢查 Excel 檔案結構是否符合上傳腳本要求')
+    ap.add_argument('excel', help='xlsx path or compiled catalog directory')
+    ap.add_argument('--verify-hashes', action='store_true', help='compiled catalog: recompute every row hash against the manifest')
+    args = ap.parse_args(argv)
+
+    if os.path.isdir(args.excel):
+        return 0 if check_compiled_catalog(args.excel, args.verify_hashes) else 1
+    return 0 if check_excel_structure(args.excel) else 1
+
 if __name__ == '__main__':
-    excel_file = 'learning_bubble_template_1.xlsx'
-    if len(sys.argv) > 1:
-        excel_file = sys.argv[1]
-    
-    check_excel_structure(excel_file)
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""把 Excel 編譯成欄式的 catalog 產物，後續工具直接讀它而不必重新解析 Excel
+
+產物是一個資料夾：
+
+    <out>/manifest.json        格式版本、來源檔、每個集合的欄位型別與逐列雜湊
+    <out>/<集合>.arrow          每個集合一個 Arrow IPC 檔（不壓縮，可 memory map 讀取）
+
+每列的雜湊是文件內容（即上傳到 Firestore 的資料）的 sha1，兩個版本只要比對
+manifest 就知道哪些文件新增、刪除或變動，CI 不需要碰 Excel 也不需要讀資料檔。
+
+只需要部分欄位的工具（validate、simulate）用 read_table 直接取 Arrow 欄位，
+資料由作業系統按需分頁載入，不會複製；需要整份文件的工具（upload、export、dedup）
+用 load_catalog 轉成 dict，這一步會複製，但可以先用 ids 篩選只轉需要的列。
+
+Arrow 的欄位是所有文件欄位的聯集。只有部分文件才有的欄位（例如 FEATURED_LISTS
+依 type 放 productIds / topicIds）記在 manifest 的 sparse，讀回時值為 null 就
+視為沒有這個欄位；這些欄位本身不會是 None。上傳腳本直接沿用儲存格值的欄位
+（version、source 等）可能同一欄混用文字與數字，這類欄位逐格存成 JSON 字串並記在
+manifest 的 json，讀回時還原成原本的型別。
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from export_catalog import to_json_value
+from upload_v3_excel import (
+    attach_previews, default_report_path, empty_catalog, parse_workbook, report_quarantine,
+)
+
+FORMAT_VERSION = 2
+MANIFEST = "manifest.json"
+ID_COLUMN = "_id"
+
+
+def row_hash(data):
+    """文件內容的 sha1（與 export_catalog 的 JSON 相同的正規化方式）"""
+    text = json.dumps(data, ensure_ascii=False, sort_keys=True, default=to_json_value)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def to_table(docs):
+    """{docId: data} -> (Arrow table, sparse 欄位, json 欄位)"""
+    ids = list(docs)
+    fields = []
+    for data in docs.values():
+        fields.extend(f for f in data if f not in fields)
+    sparse = sorted(f for f in fields if any(f not in data for data in docs.values()))
+
+    columns = {ID_COLUMN: pa.array(ids, type=pa.string())}
+    json_fields = []
+    for field in fields:
+        values = [to_arrow_value(docs[i].get(field)) for i in ids]
+        column = None
+        # 同一欄混用型別（例如 "v1" 與 2、1 與 1.5）時 Arrow 會報錯或把整數轉成浮點數
+        if len({type(v) for v in values if v is not None}) <= 1:
+            try:
+                column = pa.array(values)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                pass
+        if column is None:
+            column = pa.array([None if v is None else encode_json(v) for v in values], type=pa.string())
+            json_fields.append(field)
+        columns[field] = column
+    return pa.table(columns), sparse, json_fields
+
+
+def to_arrow_value(v):
+    """numpy / pandas 的純量轉成 Python 型別，其餘原樣交給 Arrow 推斷"""
+    if isinstance(v, list):
+        return [to_arrow_value(x) for x in v]
+    if isinstance(v, dict):
+        return {k: to_arrow_value(x) for k, x in v.items()}
+    if hasattr(v, "to_pydatetime"):
+        return v.to_pydatetime()
+    if hasattr(v, "item") and not isinstance(v, (str, bytes)):
+        return v.item()
+    return v
+
+
+def encode_json(v):
+    """JSON 沒有時間型別，時間存成 {"$datetime": iso}"""
+    def default(x):
+        if isinstance(x, datetime):
+            return {"$datetime": x.isoformat()}
+        if isinstance(x, date):
+            return {"$date": x.isoformat()}
+        raise TypeError(f"無法編譯 {type(x).__name__} 型別的值")
+    return json.dumps(v, ensure_ascii=False, default=default)
+
+
+def decode_json(text):
+    def hook(obj):
+        if set(obj) == {"$datetime"}:
+            return datetime.fromisoformat(obj["$datetime"])
+        if set(obj) == {"$date"}:
+            return date.fromisoformat(obj["$date"])
+        return obj
+    return json.loads(text, object_hook=hook)
+
+
+def compile_catalog(catalog, out, source=None):
+    """把 catalog 寫成 <out>/<集合>.arrow 與 manifest.json，回傳 manifest"""
+    os.makedirs(out, exist_ok=True)
+    manifest = {
+        "format": FORMAT_VERSION,
+        "compiledAt": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "source": os.path.basename(source) if source else None,
+        "sourceSha1": file_sha1(source) if source else None,
+        "entities": {},
+    }
+    for name, docs in catalog.items():
+        table, sparse, json_fields = to_table(docs)
+        path = os.path.join(out, f"{name}.arrow")
+        # 先寫暫存檔再改名，讀取端不會看到寫到一半的檔案
+        with pa.OSFile(path + ".tmp", "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(path + ".tmp", path)
+        hashes = {doc_id: row_hash(data) for doc_id, data in docs.items()}
+        manifest["entities"][name] = {
+            "file": f"{name}.arrow",
+            "rows": len(docs),
+            "schema": {f.name: str(f.type) for f in table.schema if f.name != ID_COLUMN},
+            "sparse": sparse,
+            "json": json_fields,
+            "sha1": hashlib.sha1("".join(f"{k}:{v}\n" for k, v in sorted(hashes.items())).encode()).hexdigest(),
+            "rowHashes": hashes,
+        }
+    # catalog 版本由內容決定，相同內容重新編譯會得到相同版本
+    manifest["version"] = hashlib.sha1(
+        "".join(manifest["entities"][name]["sha1"] for name in sorted(manifest["entities"])).encode()
+    ).hexdigest()[:12]
+    with open(os.path.join(out, MANIFEST + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(os.path.join(out, MANIFEST + ".tmp"), os.path.join(out, MANIFEST))
+    return manifest
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{path} 的格式版本 {manifest.get('format')} 與目前的 {FORMAT_VERSION} 不同，請重新編譯")
+    return manifest
+
+
+def read_table(path, name, manifest=None, columns=None):
+    """以 memory map 開啟一個集合的 Arrow 檔；欄位資料不會複製，由作業系統按需分頁載入
+
+    columns 可只取部分欄位；manifest 中列為 json 的欄位仍是 JSON 字串，需要時用 decode_json。
+    """
+    manifest = manifest or read_manifest(path)
+    source = pa.memory_map(os.path.join(path, manifest["entities"][name]["file"]), "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+def load_catalog(path, names=None, ids=None):
+    """讀回 parse_workbook 格式的 catalog
+
+    names 可只讀部分集合；ids 為 {集合: docId 集合} 時只把這些列轉成 dict。
+    """
+    manifest = read_manifest(path)
+    catalog = empty_catalog()
+    for name, entity in manifest["entities"].items():
+        if names is not None and name not in names:
+            continue
+        table = read_table(path, name, manifest)
+        if ids is not None and name in ids:
+            table = table.filter(pc.is_in(table[ID_COLUMN], value_set=pa.array(sorted(ids[name]), type=pa.string())))
+        sparse = set(entity["sparse"])
+        json_fields = set(entity["json"])
+        docs = {}
+        for row in table.to_pylist():
+            doc_id = row.pop(ID_COLUMN)
+            docs[doc_id] = {
+                k: decode_json(v) if k in json_fields and v is not None else v
+                for k, v in row.items() if not (v is None and k in sparse)
+            }
+        catalog[name] = docs
+    return catalog
+
+
+def diff_manifests(old, new):
+    """只用逐列雜湊比對兩個版本，回傳 {集合: {"added", "removed", "changed"}}"""
+    result = {}
+    for name in new["entities"]:
+        before = old["entities"].get(name, {}).get("rowHashes", {})
+        after = new["entities"][name]["rowHashes"]
+        result[name] = {
+            "added": sorted(set(after) - set(before)),
+            "removed": sorted(set(before) - set(after)),
+            "changed": sorted(i for i in after if i in before and before[i] != after[i]),
+        }
+    return result
+
+
+def changed_catalog(path, since):
+    """只讀出 path 中相對於 since 版本新增或變動的文件（只比對 manifest，其餘列不會轉成 dict）
+
+    ui/segments_v1 是單一文件，任何區段變動時整份區段清單都要重傳（同 diff_catalog）。
+    """
+    new = read_manifest(path)
+    diff = diff_manifests(read_manifest(since), new)
+    names = [name for name, d in diff.items() if d["added"] or d["changed"] or (name == "segments" and d["removed"])]
+    ids = {name: set(d["added"]) | set(d["changed"]) for name, d in diff.items() if name != "segments"}
+    return load_catalog(path, names=names, ids=ids), diff
+
+
+def print_diff(diff, limit=10):
+    total = 0
+    for name, d in diff.items():
+        counts = {kind: len(ids) for kind, ids in d.items()}
+        total += sum(counts.values())
+        if not any(counts.values()):
+            continue
+        print(f"   {name}: 新增 {counts['added']}、刪除 {counts['removed']}、變動 {counts['changed']}")
+        for kind, mark in (("added", "+"), ("removed", "-"), ("changed", "~")):
+            for doc_id in d[kind][:limit]:
+                print(f"      {mark} {doc_id}")
+            if len(d[kind]) > limit:
+                print(f"      ...（共 {len(d[kind])} 筆）")
+    return total
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="把 Excel 編譯成 Arrow + manifest 的 catalog 產物，或比對兩個已編譯的版本")
+    ap.add_argument("--excel", help="xlsx path to compile")
+    ap.add_argument("--out", help="output directory for the compiled catalog")
+    ap.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"), help="compare two compiled catalogs by row hash")
+    ap.add_argument("--fail-on-changes", action="store_true", help="with --diff: exit 1 when the versions differ")
+    ap.add_argument("--max-errors", type=int, default=0, help="fail only if more than this many rows fail to convert")
+    ap.add_argument("--quarantine-report", help="csv path for rows that failed to convert (default: <excel>_quarantine.csv)")
+    args = ap.parse_args(argv)
+
+    if args.diff:
+        old, new = (read_manifest(p) for p in args.diff)
+        print(f"📊 {old['version']} → {new['version']}")
+        total = print_diff(diff_manifests(old, new))
+        if not total:
+            print("✅ 兩個版本內容相同")
+            return 0
+        print(f"⚠️  共 {total} 筆文件不同")
+        return 1 if args.fail_on_changes else 0
+
+    if not args.excel or not args.out:
+        ap.error("--excel and --out are required unless --diff is given")
+
+    started = time.monotonic()
+    quarantine = []
+    catalog = parse_workbook(args.excel, quarantine=quarantine)
+    report_path = args.quarantine_report or default_report_path(args.excel)
+    if not report_quarantine(quarantine, report_path, args.max_errors):
+        return 1
+    manifest = compile_catalog(attach_previews(catalog), args.out, source=args.excel)
+
+    counts = ", ".join(f"{name} {e['rows']}" for name, e in manifest["entities"].items())
+    print(f"✅ 已編譯 {args.out}（版本 {manifest['version']}；{counts}；{time.monotonic() - started:.2f}s）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
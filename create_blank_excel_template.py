@@ -1,47 +1,233 @@
-import pandas as pd
-import openpyxl
-
-def create_blank_template(source_excel, output_excel):
-    """從現有 Excel 檔案創建空白模板"""
-    
-    # 讀取原始 Excel 檔案
-    xlsx = pd.ExcelFile(source_excel)
-    
-    print(f'📖 讀取原始檔案: {source_excel}')
-    print(f'   找到 {len(xlsx.sheet_names)} 個 sheets: {xlsx.sheet_names}\n')
-    
-    # 創建新的 Excel writer
-    with pd.ExcelWriter(output_excel, engine='openpyxl') as writer:
-        for sheet_name in xlsx.sheet_names:
-            # 讀取原始 sheet（只讀取第一行作為欄位名稱）
-            df = pd.read_excel(xlsx, sheet_name=sheet_name, nrows=0)
-            
-            # 創建只有欄位名稱的空 DataFrame
-            blank_df = pd.DataFrame(columns=df.columns)
-            
-            # 寫入空白 sheet
-            blank_df.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-            print(f'✅ 創建空白 sheet: {sheet_name}')
-            print(f'   欄位數: {len(df.columns)}')
-            if len(df.columns) > 0:
-                print(f'   欄位: {", ".join(df.columns[:8])}{"..." if len(df.columns) > 8 else ""}')
-            print()
-    
-    print(f'✅ 空白模板已創建: {output_excel}')
+import argparse
+import sys
+import time
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.comments import Comment
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.datavalidation import DataValidation
+
+# 模板版本，寫在檔案摘要資訊（檔案 > 內容）中；欄位有變動時加一
+TEMPLATE_VERSION = 2
+
+# 每個工作表的欄位：(欄位, 必填, 說明)；順序與上傳腳本讀取的欄位一致
+SCHEMA = {
+    'TOPICS': [
+        ('topicId', True, 'topics/{topicId} 的文件 id'),
+        ('title', True, '主題名稱'),
+        ('published', True, '是否上架'),
+        ('order', True, '排序（整數，小的在前）'),
+        ('tags', False, '標籤，多個以 ; 分隔（UI_SEGMENTS mode=tag 用）'),
+        ('bubbleImageUrl', False, '泡泡圖片網址'),
+        ('bubbleStorageFile', False, '泡泡圖片在 Storage 的檔名'),
+        ('bubbleGradStart', False, '泡泡漸層起始色，例如 #FF8A65'),
+        ('bubbleGradEnd', False, '泡泡漸層結束色'),
+        ('createdAt', False, '建立時間（不會上傳）'),
+        ('updatedAt', False, '更新時間（不會上傳）'),
+    ],
+    'PRODUCTS': [
+        ('productId', True, 'products/{productId} 的文件 id'),
+        ('type', False, '產品類型'),
+        ('topicId', True, '所屬主題'),
+        ('level', True, '等級，例如 L1'),
+        ('levelGoal', False, '這個等級的學習目標'),
+        ('levelBenefit', False, '學完的收穫'),
+        ('anchorGroup', False, '錨點群組'),
+        ('version', False, '內容版本'),
+        ('published', False, '是否上架'),
+        ('order', False, '排序（整數，空白為 0；可用 order 指令產生）'),
+        ('coverImageUrl', False, '封面圖片網址'),
+        ('coverStorageFile', False, '封面圖片在 Storage 的檔名'),
+        ('itemCount', False, '卡片數（整數）'),
+        ('wordCountAvg', False, '平均字數（整數）'),
+        ('pushStrategy', False, '推播順序策略'),
+        ('sourceType', False, '來源類型'),
+        ('source', False, '來源'),
+        ('sourceUrl', False, '來源網址'),
+        ('spec1Label', False, '規格 1 文字'),
+        ('spec1Icon', False, '規格 1 圖示'),
+        ('spec2Label', False, '規格 2 文字'),
+        ('spec2Icon', False, '規格 2 圖示'),
+        ('spec3Label', False, '規格 3 文字'),
+        ('spec3Icon', False, '規格 3 圖示'),
+        ('spec4Label', False, '規格 4 文字'),
+        ('spec4Icon', False, '規格 4 圖示'),
+        ('trialMode', False, '試讀方式'),
+        ('trialLimit', False, '試讀卡片數（整數，空白為 3）'),
+        ('title', False, '產品名稱（空白時用 topicId + level）'),
+        ('titleLower', False, '搜尋用小寫名稱（空白時由 title 產生）'),
+    ],
+    'CONTENT_ITEMS': [
+        ('itemId', True, 'content_items/{itemId} 的文件 id'),
+        ('productId', True, '所屬產品'),
+        ('type', False, '內容類型'),
+        ('topicId', False, '所屬主題'),
+        ('level', False, '等級'),
+        ('anchorGroup', False, '錨點群組'),
+        ('anchor', False, '錨點（卡片標題）'),
+        ('intent', False, '意圖，例如 定義 / 延伸'),
+        ('difficulty', False, '難度（整數，空白為 1）'),
+        ('content', False, '卡片內容'),
+        ('wordCount', False, '字數（整數）'),
+        ('reusable', False, '可否重複使用'),
+        ('version', False, '內容版本'),
+        ('seq', False, '產品內順序（整數；可用 order --content 產生）'),
+        ('isPreview', False, '是否為試讀卡片'),
+        ('mediaImageUrl', False, '圖片網址'),
+        ('mediaStorageFile', False, '圖片在 Storage 的檔名'),
+        ('sourceType', False, '來源類型'),
+        ('source', False, '來源'),
+        ('sourceUrl', False, '來源網址'),
+        ('pushOrder', False, '推播順序（整數；可用 order --content 產生）'),
+    ],
+    'FEATURED_LISTS': [
+        ('listId', True, 'featured_lists/{listId} 的文件 id，例如 home_banners'),
+        ('title', True, '清單名稱'),
+        ('type', True, 'ids 放的是產品還是主題'),
+        ('topicIds', False, '（保留欄位，請填在 ids）'),
+        ('productIds', False, '（保留欄位，請填在 ids）'),
+        ('published', False, '是否上架'),
+        ('order', False, '排序'),
+        ('updatedAt', False, '更新時間（不會上傳）'),
+        ('ids', True, 'id 清單，多個以 ; 分隔'),
+    ],
+    'UI_SEGMENTS': [
+        ('configId', False, '設定 id（不會上傳）'),
+        ('segmentId', True, '區段 id'),
+        ('title', True, '區段名稱'),
+        ('order', True, '排序（整數）'),
+        ('mode', True, 'all 顯示全部主題；tag 只顯示有 tag 標籤的主題'),
+        ('tag', False, 'mode=tag 時使用的標籤'),
+        ('topicIds', False, '（保留欄位）'),
+        ('published', True, '是否上架；未上架的區段不會上傳'),
+    ],
+}
+
+# 這些欄位在每個工作表都是布林下拉選單；現有資料多以 1 / 0 表示，一併允許
+BOOLEAN_COLUMNS = ('published', 'isPreview', 'reusable')
+BOOLEAN_CHOICES = ('TRUE', 'FALSE', '1', '0')
+
+# 其他下拉選單：{(工作表, 欄位): (選項, 是否只能選清單中的值)}
+CHOICES = {
+    ('UI_SEGMENTS', 'mode'): (('all', 'tag'), True),
+    ('FEATURED_LISTS', 'type'): (('productIds', 'topicIds'), True),
+    ('PRODUCTS', 'type'): (('knowledge_pack', 'course'), False),
+    ('CONTENT_ITEMS', 'type'): (('card',), False),
+    ('PRODUCTS', 'trialMode'): (('previewFlag',), False),
+    ('PRODUCTS', 'pushStrategy'): (('seq', 'daily'), False),
+}
+
+
+def choices(sheet, name):
+    if name in BOOLEAN_COLUMNS:
+        return BOOLEAN_CHOICES, True
+    return CHOICES.get((sheet, name))
+
+
+HEADER_FONT = Font(bold=True)
+REQUIRED_FILL = PatternFill('solid', fgColor='FFF2CC')
+LAST_ROW = 1048576
+
+
+def header_cell(ws, sheet, name, required, note):
+    """標題列：必填欄位加底色，註解寫上說明與可選的值"""
+    cell = WriteOnlyCell(ws, name)
+    cell.font = HEADER_FONT
+    if required:
+        cell.fill = REQUIRED_FILL
+    text = f'{"必填" if required else "選填"}：{note}'
+    if choices(sheet, name):
+        text += f'\n可選：{" / ".join(choices(sheet, name)[0])}'
+    cell.comment = Comment(text, 'template', width=260, height=90)
+    return cell
+
+
+def add_choices(ws, sheet, columns):
+    for i, (name, _, _) in enumerate(columns, 1):
+        if not choices(sheet, name):
+            continue
+        values, strict = choices(sheet, name)
+        dv = DataValidation(type='list', formula1=f'"{",".join(values)}"', allow_blank=True, showErrorMessage=True)
+        dv.errorTitle = name
+        if strict:
+            dv.error = f'請從清單選擇：{" / ".join(values)}'
+        else:
+            # 新的類型仍可直接輸入，Excel 只會跳出警告讓使用者確認
+            dv.errorStyle = 'warning'
+            dv.error = f'不是常用的值（{" / ".join(values)}），確定要使用嗎？'
+        col = get_column_letter(i)
+        dv.add(f'{col}2:{col}{LAST_ROW}')
+        ws.data_validations.append(dv)
+
+
+def presized_rows(sheet, product_ids, items_per_product, topic_id):
+    """預先產生 id 欄位的列，產品與卡片編號方式與現有資料相同（<productId>_0001）"""
+    if sheet == 'PRODUCTS':
+        for pid in product_ids:
+            yield {'productId': pid, 'topicId': topic_id}
+    elif sheet == 'CONTENT_ITEMS':
+        for pid in product_ids:
+            for seq in range(1, items_per_product + 1):
+                yield {'itemId': f'{pid}_{seq:04d}', 'productId': pid, 'topicId': topic_id, 'seq': seq}
+
+
+def create_blank_template(output_excel, product_ids=(), items_per_product=0, topic_id=None):
+    """依 SCHEMA 直接寫出空白模板（write-only，不需要現有的 Excel）
+
+    product_ids 有值時，PRODUCTS 與 CONTENT_ITEMS 會預先填好 id 欄位，
+    每個產品 items_per_product 列卡片，方便大量編寫。
+    """
+    wb = Workbook(write_only=True)
+    wb.properties.title = 'Learning Bubbles upload template'
+    wb.properties.keywords = f'templateVersion={TEMPLATE_VERSION}'
+    rows = {}
+    for sheet, columns in SCHEMA.items():
+        ws = wb.create_sheet(sheet)
+        ws.freeze_panes = 'A2'
+        for i, (name, _, _) in enumerate(columns, 1):
+            ws.column_dimensions[get_column_letter(i)].width = 40 if name == 'content' else max(12, len(name) + 4)
+        ws.auto_filter.ref = f'A1:{get_column_letter(len(columns))}1'
+        add_choices(ws, sheet, columns)
+
+        ws.append([header_cell(ws, sheet, name, required, note) for name, required, note in columns])
+        names = [name for name, _, _ in columns]
+        rows[sheet] = 0
+        for row in presized_rows(sheet, product_ids, items_per_product, topic_id):
+            ws.append([row.get(name) for name in names])
+            rows[sheet] += 1
+    wb.save(output_excel)
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='依欄位定義產生空白 Excel 模板（含下拉選單與欄位說明）')
+    ap.add_argument('--out', required=True, help='output xlsx path')
+    ap.add_argument('--product-ids', help='comma-separated productIds to pre-fill in PRODUCTS / CONTENT_ITEMS')
+    ap.add_argument('--items-per-product', type=int, default=0, help='CONTENT_ITEMS rows (itemId <productId>_0001...) per product')
+    ap.add_argument('--topic-id', help='topicId to pre-fill on the generated rows')
+    args = ap.parse_args(argv)
+
+    product_ids = [p.strip() for p in (args.product_ids or '').split(',') if p.strip()]
+    if args.items_per_product and not product_ids:
+        ap.error('--items-per-product requires --product-ids')
+
+    started = time.perf_counter()
+    rows = create_blank_template(args.out, product_ids, args.items_per_product, args.topic_id)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    print(f'✅ 空白模板已創建: {args.out}（{len(SCHEMA)} 個工作表，{elapsed:.0f}ms）')
+    for sheet, count in rows.items():
+        if count:
+            print(f'   {sheet}: 預先產生 {count} 列')
     print(f'\n💡 使用說明:')
-    print(f'   1. 打開 {output_excel}')
-    print(f'   2. 在對應的 sheet 中填入資料')
+    print(f'   1. 打開 {args.out}，黃色標題為必填欄位，滑到標題上可看說明')
+    print(f'   2. 在對應的 sheet 中填入資料（published / mode / type 等欄位有下拉選單）')
     print(f'   3. 只填寫需要更新的欄位即可（其他欄位可留空）')
-    print(f'   4. 執行上傳腳本: python3 upload_v3_excel.py --key tools/keys/service-account.json --excel {output_excel}')
+    print(f'   4. 執行上傳腳本: python3 upload_v3_excel.py --key tools/keys/service-account.json --excel {args.out}')
+    return 0
+
 
 if __name__ == '__main__':
-    source_excel = 'learning_bubble_upload_ready_v2_all_fixed.xlsx'
-    output_excel = 'learning_bubble_template_blank.xlsx'
-    
-    try:
-        create_blank_template(source_excel, output_excel)
-    except Exception as e:
-        print(f'❌ 錯誤: {e}')
-        import traceback
-        traceback.print_exc()
+    sys.exit(main())
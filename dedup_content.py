@@ -0,0 +1,261 @@
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sys
+import unicodedata
+import zlib
+
+import numpy as np
+
+from upload_v3_excel import load_source
+
+# MinHash 參數；改動任何一個都會讓快取失效
+NUM_PERM = 128
+SHINGLE_SIZE = 3
+SEED = 20240601
+
+# 中日韓文字逐字切開（中文沒有空白分詞），其餘連續英數字視為一個詞
+TOKEN_RE = re.compile(
+    r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]"
+    r"|[0-9a-zà-ɏ]+"
+)
+
+
+def normalize(text):
+    """全形轉半形、英文轉小寫；空白與標點在切 token 時自然略過"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """連續 size 個 token 組成一個 shingle，轉成 32-bit 雜湊"""
+    tokens = tokenize(text)
+    if not tokens:
+        return np.zeros(0, dtype=np.uint64)
+    if len(tokens) <= size:
+        grams = {" ".join(tokens)}
+    else:
+        grams = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+    return np.array([zlib.crc32(g.encode("utf-8")) for g in grams], dtype=np.uint64)
+
+
+def content_key(text):
+    """用正規化後的 token 當作 item 的雜湊，快取與完全重複都以它為準"""
+    return hashlib.sha1(" ".join(tokenize(text)).encode("utf-8")).hexdigest()
+
+
+def permutations(num_perm=NUM_PERM, seed=SEED):
+    """multiply-shift 雜湊：h(x) = (a * x + b) mod 2^64 >> 32，a 為奇數"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash(hashes, perms):
+    a, b = perms
+    if len(hashes) == 0:
+        return np.full(len(a), np.iinfo(np.uint32).max, dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        values = (hashes[:, None] * a[None, :] + b[None, :]) >> np.uint64(32)
+    return values.min(axis=0).astype(np.uint32)
+
+
+def lsh_params(threshold, num_perm=NUM_PERM):
+    """選出 bands × rows，使 LSH 的門檻 (1/b)^(1/r) 最接近且不高於 threshold"""
+    best = (1, num_perm)
+    best_gap = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        lsh_threshold = (1.0 / bands) ** (1.0 / rows)
+        if lsh_threshold > threshold:
+            continue
+        gap = threshold - lsh_threshold
+        if best_gap is None or gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+def load_cache(path):
+    """快取：{content_key: signature}；參數不同時整份作廢"""
+    if not path or not os.path.exists(path):
+        return {}
+    data = np.load(path)
+    if tuple(data["params"]) != (NUM_PERM, SHINGLE_SIZE, SEED):
+        return {}
+    return dict(zip(data["keys"].tolist(), data["sigs"]))
+
+
+def save_cache(path, cache):
+    keys = sorted(cache)
+    sigs = np.array([cache[k] for k in keys], dtype=np.uint32).reshape(len(keys), NUM_PERM)
+    # np.savez 會自動補 .npz，直接寫入檔案物件以保留原檔名
+    with open(path, "wb") as f:
+        np.savez(f, params=np.array([NUM_PERM, SHINGLE_SIZE, SEED]), keys=np.array(keys), sigs=sigs)
+
+
+def signatures(keys, texts, cache):
+    """計算（或從快取取出）每個唯一內容的 MinHash 簽章，回傳 (矩陣, 新算的數量)"""
+    perms = permutations()
+    sigs = np.empty((len(keys), NUM_PERM), dtype=np.uint32)
+    computed = 0
+    for i, (key, text) in enumerate(zip(keys, texts)):
+        sig = cache.get(key)
+        if sig is None:
+            sig = minhash(shingles(text), perms)
+            cache[key] = sig
+            computed += 1
+        sigs[i] = sig
+    return sigs, computed
+
+
+def find_root(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_duplicates(items, threshold=0.8, cache=None):
+    """找出 CONTENT_ITEMS 中完全相同與高度相似的 content
+
+    items 為 {itemId: data}（catalog["content_items"]）。先把正規化後內容相同的
+    item 合併，再對唯一內容做 MinHash + LSH 分桶，只比對落在同一桶的候選，
+    不需要兩兩比較。回傳 [cluster]，每個 cluster 為
+    {"items": [(itemId, productId)], "similarity": 估計的最低相似度, "exact": bool}。
+    """
+    if cache is None:
+        cache = {}
+
+    groups = {}
+    texts = {}
+    for iid, data in items.items():
+        content = data.get("content") or ""
+        # 空白或只有標點、emoji 的內容沒有 token，雜湊都一樣，不能當成重複
+        if not tokenize(content):
+            continue
+        key = content_key(content)
+        groups.setdefault(key, []).append((iid, data.get("productId")))
+        texts.setdefault(key, content)
+
+    keys = list(groups)
+    sigs, computed = signatures(keys, [texts[k] for k in keys], cache)
+
+    bands, rows = lsh_params(threshold)
+    parent = list(range(len(keys)))
+    similarity = {}
+    checked = set()
+    for band in range(bands):
+        buckets = {}
+        block = np.ascontiguousarray(sigs[:, band * rows:(band + 1) * rows])
+        for i, row in enumerate(block):
+            buckets.setdefault(row.tobytes(), []).append(i)
+        for members in buckets.values():
+            for n, i in enumerate(members):
+                for j in members[n + 1:]:
+                    if (i, j) in checked:
+                        continue
+                    checked.add((i, j))
+                    sim = float(np.mean(sigs[i] == sigs[j]))
+                    if sim < threshold:
+                        continue
+                    ri, rj = find_root(parent, i), find_root(parent, j)
+                    low = min(sim, similarity.get(ri, 1.0), similarity.get(rj, 1.0))
+                    if ri != rj:
+                        parent[rj] = ri
+                    similarity[ri] = low
+
+    clusters = {}
+    for i in range(len(keys)):
+        clusters.setdefault(find_root(parent, i), []).append(i)
+
+    result = []
+    for root, members in clusters.items():
+        members_items = [item for i in members for item in groups[keys[i]]]
+        if len(members_items) < 2:
+            continue
+        result.append({
+            "items": sorted(members_items),
+            "similarity": similarity.get(root, 1.0) if len(members) > 1 else 1.0,
+            "exact": len(members) == 1,
+        })
+    result.sort(key=lambda c: (-c["similarity"], c["items"]))
+    return result, computed
+
+
+def write_report(clusters, path):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["cluster", "similarity", "exact", "itemId", "productId"])
+        for n, cluster in enumerate(clusters, 1):
+            for iid, pid in cluster["items"]:
+                writer.writerow([n, f"{cluster['similarity']:.2f}", cluster["exact"], iid, pid])
+
+
+def print_clusters(clusters, limit=20):
+    for n, cluster in enumerate(clusters[:limit], 1):
+        kind = "完全相同" if cluster["exact"] else f"相似度 ≈ {cluster['similarity']:.2f}"
+        products = {pid for _, pid in cluster["items"]}
+        print(f"   #{n} {kind}，{len(cluster['items'])} 筆，橫跨 {len(products)} 個產品")
+        for iid, pid in cluster["items"]:
+            print(f"      {pid} / {iid}")
+    if len(clusters) > limit:
+        print(f"   ...（共 {len(clusters)} 組）")
+
+
+def check_duplicates(items, threshold, cache_path=None, changed=None):
+    """上傳前檢查用：有重複時印出並回傳 False
+
+    changed 為這次要上傳的 itemId 集合時，仍對 items 全部比對（新內容可能抄了已發布的內容），
+    但只擋下包含 changed 的 cluster；已發布的舊重複不影響這次上傳。
+    """
+    cache = load_cache(cache_path)
+    clusters, computed = find_duplicates(items, threshold, cache)
+    if cache_path and computed:
+        save_cache(cache_path, cache)
+    if changed is not None:
+        clusters = [c for c in clusters if any(iid in changed for iid, _ in c["items"])]
+    if not clusters:
+        return True
+    print(f"❌ 發現 {len(clusters)} 組重複或高度相似的 content（門檻 {threshold}）:")
+    print_clusters(clusters)
+    return False
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="找出 CONTENT_ITEMS 中完全相同與高度相似的 content")
+    ap.add_argument("--excel", required=True, help="xlsx path or compiled catalog directory")
+    ap.add_argument("--threshold", type=float, default=0.8, help="estimated Jaccard similarity that counts as a duplicate")
+    ap.add_argument("--cache", help="npz file caching MinHash signatures per content hash")
+    ap.add_argument("--report", help="write clusters to this csv path")
+    ap.add_argument("--fail-on-duplicates", action="store_true", help="exit 1 when any cluster is found (for CI / pre-publish)")
+    args = ap.parse_args(argv)
+
+    catalog = load_source(args.excel, quarantine=[])
+    items = catalog["content_items"]
+
+    cache = load_cache(args.cache)
+    clusters, computed = find_duplicates(items, args.threshold, cache)
+    if args.cache and computed:
+        save_cache(args.cache, cache)
+
+    print(f"📊 {len(items)} 筆 content（新計算 {computed} 筆簽章，其餘來自快取）")
+    if not clusters:
+        print("✅ 沒有重複或高度相似的 content")
+        return 0
+
+    print(f"⚠️  {len(clusters)} 組重複或高度相似的 content:")
+    print_clusters(clusters)
+    if args.report:
+        write_report(clusters, args.report)
+        print(f"\n📝 報告: {args.report}")
+    return 1 if args.fail_on_duplicates else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
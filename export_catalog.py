@@ -0,0 +1,44 @@
+import argparse
+import json
+import sys
+
+from upload_v3_excel import attach_previews, default_report_path, load_source, report_quarantine
+
+
+def to_json_value(v):
+    """pandas/numpy 的數值與時間轉成 JSON 可接受的型別"""
+    if hasattr(v, "item"):
+        return v.item()
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    return str(v)
+
+
+def export_catalog(catalog, out):
+    """把 catalog 寫成 JSON（內容即上傳到 Firestore 的文件）"""
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False, indent=2, sort_keys=True, default=to_json_value)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="把 Excel 轉成上傳用的文件並輸出成 JSON（不連線 Firestore）")
+    ap.add_argument("--excel", required=True, help="xlsx path or compiled catalog directory")
+    ap.add_argument("--out", required=True, help="output json path")
+    ap.add_argument("--max-errors", type=int, default=0, help="fail only if more than this many rows fail to convert")
+    ap.add_argument("--quarantine-report", help="csv path for rows that failed to convert (default: <excel>_quarantine.csv)")
+    args = ap.parse_args(argv)
+
+    quarantine = []
+    catalog = load_source(args.excel, quarantine)
+    report_path = args.quarantine_report or default_report_path(args.excel)
+    if not report_quarantine(quarantine, report_path, args.max_errors):
+        return 1
+    export_catalog(attach_previews(catalog), args.out)
+
+    counts = ", ".join(f"{name} {len(docs)}" for name, docs in catalog.items())
+    print(f"✅ 已輸出 {args.out}（{counts}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -94,6 +94,9 @@ class Product {
 
   final int trialLimit;
 
+  // 上傳時依 isPreview / seq / trialLimit 算好的試讀卡片；舊資料沒有此欄位時為 null
+  final List<ContentItem>? previewItems;
+
   Product({
     required this.id,
     required this.title,
@@ -108,6 +111,7 @@ class Product {
     this.spec3Label,
     this.spec4Label,
     required this.trialLimit,
+    this.previewItems,
   });
 
   factory Product.fromDoc(String id, Map<String, dynamic> m) => Product(
@@ -124,6 +128,12 @@ class Product {
     spec3Label: m['spec3Label'],
     spec4Label: m['spec4Label'],
     trialLimit: (m['trialLimit'] ?? 3) as int,
+    previewItems: m['previewItems'] == null
+        ? null
+        : (m['previewItems'] as List)
+            .map((e) => Map<String, dynamic>.from(e as Map))
+            .map((e) => ContentItem.fromDoc(e['id'] ?? '', {...e, 'productId': id, 'isPreview': true}))
+            .toList(),
   );
 }
 
@@ -47,6 +47,8 @@ final productProvider = FutureProvider.family<Product?, String>((ref, productId)
 final previewItemsProvider = FutureProvider.family<List<ContentItem>, String>((ref, productId) async {
   final repo = ref.watch(v2RepoProvider);
   final p = await ref.watch(productProvider(productId).future);
+  // 產品文件已內嵌試讀卡片時不用再查 content_items
+  if (p?.previewItems != null) return p!.previewItems!;
   return repo.fetchPreviewItems(productId, p?.trialLimit ?? 3);
 });
 
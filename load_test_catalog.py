@@ -0,0 +1,301 @@
+"""對 Firestore 模擬器重播 app 瀏覽 catalog 的讀取模式，量測延遲與讀取量
+
+每個「畫面」照 lib/providers/v2_providers.dart 與 lib/data/repository.dart 實際發出的
+查詢組成（同一畫面中互不相依的 provider 會同時發出）：
+
+    home          3 份精選清單：featured_lists/{id} + products whereIn（home_banners 取前 3 個）
+    category      ui/segments_v1 + topics published / tags arrayContains orderBy order
+    product_list  products published + topicId orderBy order
+    product       products/{id}，沒有內嵌 previewItems 時再查 content_items isPreview orderBy seq limit
+    library       content_items productId orderBy seq（V1 DataRepository）
+    search        products titleLower 前綴 orderBy titleLower limit 20
+
+讀取量依 Firestore 計費方式估算：單一文件 get 算 1 次，查詢算回傳的文件數
+（沒有結果時至少 1 次）。模擬器不計費，金額只是依 --price-per-100k-reads 換算。
+只能連模擬器，避免誤對正式環境壓測。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+from google.cloud.firestore import AsyncClient, FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from upload_v3_excel import (
+    EMULATOR_PROJECT, attach_previews, connect_firestore, default_report_path, load_source,
+    report_quarantine, upload_catalog,
+)
+
+# 與 home_page.dart 相同的精選清單
+HOME_LISTS = (("home_banners", 3), ("weekly_pick", None), ("hot_all", None))
+DEFAULT_MIX = "home=3,category=2,product_list=2,product=3,library=1,search=1"
+# Firestore 文件讀取的牌價（美元 / 10 萬次），各區域不同
+DEFAULT_PRICE = 0.06
+
+
+def published(query):
+    return query.where(filter=FieldFilter("published", "==", True))
+
+
+async def get_doc(trace, name, ref):
+    started = time.perf_counter()
+    snap = await ref.get()
+    trace.append({"query": name, "ms": (time.perf_counter() - started) * 1000, "reads": 1})
+    return snap
+
+
+async def run_query(trace, name, query):
+    started = time.perf_counter()
+    docs = await query.get()
+    trace.append({"query": name, "ms": (time.perf_counter() - started) * 1000, "reads": max(len(docs), 1)})
+    return docs
+
+
+# ---------------------------------------------------------------------------
+# 畫面（對應 lib/pages 下的頁面）
+
+async def featured_products(db, trace, list_id, take):
+    """featuredProductsProvider / bannerProductsProvider"""
+    snap = await get_doc(trace, "featured_list", db.collection("featured_lists").document(list_id))
+    data = snap.to_dict() if snap.exists else None
+    if not data or data.get("published") is not True:
+        return
+    ids = (data.get("productIds") or [])[:take]
+    if not ids:
+        return
+    refs = [db.collection("products").document(i) for i in ids]
+    query = published(db.collection("products").where(filter=FieldFilter(FieldPath.document_id(), "in", refs)))
+    await run_query(trace, "products_by_ids", query)
+
+
+async def screen_home(db, ctx, rng, trace):
+    await asyncio.gather(*(featured_products(db, trace, list_id, take) for list_id, take in HOME_LISTS))
+
+
+async def screen_category(db, ctx, rng, trace):
+    snap = await get_doc(trace, "segments", db.collection("ui").document("segments_v1"))
+    segments = [s for s in (snap.to_dict() or {}).get("segments", []) if s.get("published")] if snap.exists else []
+    if not segments:
+        return
+    seg = rng.choice(segments)
+    query = published(db.collection("topics"))
+    if seg.get("mode") == "tag" and seg.get("tag"):
+        query = query.where(filter=FieldFilter("tags", "array_contains", seg["tag"]))
+    await run_query(trace, "topics_for_segment", query.order_by("order"))
+
+
+async def screen_product_list(db, ctx, rng, trace):
+    topic_id = rng.choice(ctx["topics"])
+    query = published(db.collection("products")).where(filter=FieldFilter("topicId", "==", topic_id))
+    await run_query(trace, "products_by_topic", query.order_by("order"))
+
+
+async def screen_product(db, ctx, rng, trace):
+    """productProvider，previewItemsProvider 等它完成後才決定要不要查詢"""
+    product_id = rng.choice(ctx["products"])
+    snap = await get_doc(trace, "product", db.collection("products").document(product_id))
+    data = snap.to_dict() if snap.exists else None
+    if data and data.get("previewItems") is not None:
+        return
+    limit = (data or {}).get("trialLimit") or 3
+    query = (
+        db.collection("content_items")
+        .where(filter=FieldFilter("productId", "==", product_id))
+        .where(filter=FieldFilter("isPreview", "==", True))
+        .order_by("seq")
+        .limit(limit)
+    )
+    await run_query(trace, "preview_items", query)
+
+
+async def screen_library(db, ctx, rng, trace):
+    product_id = rng.choice(ctx["products"])
+    query = db.collection("content_items").where(filter=FieldFilter("productId", "==", product_id)).order_by("seq")
+    await run_query(trace, "content_by_product", query)
+
+
+async def screen_search(db, ctx, rng, trace):
+    title = rng.choice(ctx["titles"]) or "a"
+    prefix = title.lower()[:rng.randint(1, 3)]
+    query = (
+        published(db.collection("products"))
+        .where(filter=FieldFilter("titleLower", ">=", prefix))
+        .where(filter=FieldFilter("titleLower", "<", prefix + "\uf8ff"))
+        .order_by("titleLower")
+        .limit(20)
+    )
+    await run_query(trace, "search_prefix", query)
+
+
+SCREENS = {
+    "home": screen_home,
+    "category": screen_category,
+    "product_list": screen_product_list,
+    "product": screen_product,
+    "library": screen_library,
+    "search": screen_search,
+}
+
+
+def parse_mix(text):
+    """"home=3,product=1" -> {畫面: 權重}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCREENS:
+            raise ValueError(f"未知的畫面 {name!r}，可用: {', '.join(SCREENS)}")
+        mix[name] = float(weight or 1)
+    return {name: w for name, w in mix.items() if w > 0}
+
+
+async def load_context(db):
+    """壓測前先讀出可用的 topic / product id（不計入結果）"""
+    topics = [d.id async for d in published(db.collection("topics")).stream()]
+    products = {}
+    async for d in published(db.collection("products")).stream():
+        products[d.id] = (d.to_dict() or {}).get("titleLower") or ""
+    return {"topics": topics, "products": list(products), "titles": list(products.values())}
+
+
+async def run_load(db, ctx, mix, screens, concurrency, seed):
+    """concurrency 個虛擬使用者依 mix 的權重輪流開啟畫面，共 screens 次"""
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    results = []
+    remaining = [screens]
+
+    async def user(n):
+        rng = random.Random(seed + n)
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            name = rng.choices(names, weights)[0]
+            trace = []
+            started = time.perf_counter()
+            await SCREENS[name](db, ctx, rng, trace)
+            results.append({
+                "screen": name,
+                "ms": (time.perf_counter() - started) * 1000,
+                "reads": sum(t["reads"] for t in trace),
+                "queries": trace,
+            })
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(n) for n in range(concurrency)))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed, price):
+    screens = {}
+    for name in SCREENS:
+        rows = [r for r in results if r["screen"] == name]
+        if not rows:
+            continue
+        ms = np.array([r["ms"] for r in rows])
+        reads = np.array([r["reads"] for r in rows])
+        screens[name] = {
+            "count": len(rows),
+            "p50": float(np.percentile(ms, 50)),
+            "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)),
+            "max": float(ms.max()),
+            "readsPerScreen": float(reads.mean()),
+            "queriesPerScreen": float(np.mean([len(r["queries"]) for r in rows])),
+        }
+    queries = {}
+    for r in results:
+        for q in r["queries"]:
+            queries.setdefault(q["query"], []).append(q["ms"])
+    total_reads = sum(r["reads"] for r in results)
+    reads_per_screen = total_reads / len(results) if results else 0.0
+    return {
+        "screens": screens,
+        "queries": {
+            name: {"count": len(ms), "p50": float(np.percentile(ms, 50)), "p99": float(np.percentile(ms, 99))}
+            for name, ms in queries.items()
+        },
+        "totalScreens": len(results),
+        "elapsed": elapsed,
+        "totalReads": total_reads,
+        "readsPerScreen": reads_per_screen,
+        "cost": total_reads / 100000 * price,
+        "costPerMillionScreens": reads_per_screen * 1_000_000 / 100000 * price,
+    }
+
+
+def print_summary(summary, concurrency):
+    print(f"\n{'screen':<13} {'count':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'reads':>7} {'queries':>7}")
+    for name, s in summary["screens"].items():
+        print(f"{name:<13} {s['count']:>6} {s['p50']:>8.1f} {s['p90']:>8.1f} {s['p99']:>8.1f} {s['max']:>8.1f}"
+              f" {s['readsPerScreen']:>7.1f} {s['queriesPerScreen']:>7.1f}")
+    print(f"\n{'query':<20} {'count':>6} {'p50':>8} {'p99':>8}")
+    for name, q in sorted(summary["queries"].items()):
+        print(f"{name:<20} {q['count']:>6} {q['p50']:>8.1f} {q['p99']:>8.1f}")
+    rate = summary["totalScreens"] / summary["elapsed"] if summary["elapsed"] else 0.0
+    print(f"\n📊 {summary['totalScreens']} 個畫面，並行 {concurrency}，{summary['elapsed']:.1f}s（{rate:.0f} 畫面/s），延遲單位 ms")
+    print(f"📖 讀取 {summary['totalReads']} 次，平均每個畫面 {summary['readsPerScreen']:.2f} 次")
+    print(f"💰 本次約 ${summary['cost']:.4f}；同樣的畫面組合每 100 萬次約 ${summary['costPerMillionScreens']:.2f}")
+
+
+def seed_emulator(path, emulator, project, max_errors):
+    """用上傳腳本把 xlsx（或編譯後的 catalog）寫進模擬器"""
+    quarantine = []
+    catalog = load_source(path, quarantine)
+    if not report_quarantine(quarantine, default_report_path(path), max_errors):
+        return False
+    upload_catalog(connect_firestore(emulator=emulator, project=project), attach_previews(catalog))
+    return True
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="對 Firestore 模擬器重播 app 的 catalog 讀取模式，報告延遲百分位、每個畫面的讀取數與估計費用")
+    ap.add_argument("--emulator", required=True, help="Firestore emulator host:port, e.g. localhost:8080")
+    ap.add_argument("--project", default=EMULATOR_PROJECT, help="emulator project id")
+    ap.add_argument("--seed-from", help="upload this xlsx or compiled catalog to the emulator before the run")
+    ap.add_argument("--max-errors", type=int, default=0, help="with --seed-from: rows allowed to fail to convert")
+    ap.add_argument("--screens", type=int, default=1000, help="total screen loads")
+    ap.add_argument("--concurrency", type=int, default=20, help="simultaneous virtual users")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help=f"screen weights (default: {DEFAULT_MIX})")
+    ap.add_argument("--random-seed", type=int, default=0, help="seed for the screen / id choices")
+    ap.add_argument("--price-per-100k-reads", type=float, default=DEFAULT_PRICE, help="USD per 100k document reads")
+    ap.add_argument("--report", help="write the summary to this json path (to compare layouts)")
+    args = ap.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        ap.error(str(e))
+
+    if args.seed_from and not seed_emulator(args.seed_from, args.emulator, args.project, args.max_errors):
+        return 1
+
+    os.environ["FIRESTORE_EMULATOR_HOST"] = args.emulator
+    db = AsyncClient(project=args.project)
+
+    async def run():
+        ctx = await load_context(db)
+        if not ctx["topics"] or not ctx["products"]:
+            return None, 0.0
+        return await run_load(db, ctx, mix, args.screens, args.concurrency, args.random_seed)
+
+    results, elapsed = asyncio.run(run())
+    if results is None:
+        print("❌ 模擬器中沒有已發布的 topics / products，請先用 --seed-from 匯入資料")
+        return 1
+
+    summary = summarize(results, elapsed, args.price_per_100k_reads)
+    print_summary(summary, args.concurrency)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(dict(summary, mix=mix, concurrency=args.concurrency), f, ensure_ascii=False, indent=2)
+        print(f"📝 報告: {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
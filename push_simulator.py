@@ -0,0 +1,477 @@
+"""離線推播排程模擬器
+
+依照 lib/bubble_library/notifications/push_scheduler.dart 的規則（preset / custom 時段、
+freqPerDay、quiet hours、minIntervalMinutes、星期、全域每日上限與優先順序），
+對大量合成使用者計算每天實際會排出的推播，用來估算通知發送量與內容消耗速度。
+
+做法：
+  * 時段只跟設定有關，先把母體的設定去重，每種設定用逐行移植的 Dart 規則算一次；
+  * 每天的候選推播、每日上限與統計都以 numpy 陣列整批處理。
+
+假設（app 端目前沒有推進 progress.nextSeq 的程式）：
+  * 每天 app 重新排程一次（now = 當天 --now 時間），只取當天的推播；
+  * 使用者讀完當天推送的卡片，某產品當天只要有一則推播，進度就前進一則；
+  * 沒有收藏 / 稍後複習（savedMap 為空），所以 preferSaved、mixNewReview 會退回
+    seq 規則；seq 模式遇到缺號（bySeq 找不到）就會回到第一則，視為內容用完。
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+PRESET_SLOT_TIMES = {
+    "morning": 9 * 60 + 10,
+    "noon": 12 * 60 + 30,
+    "evening": 18 * 60 + 40,
+    "night": 21 * 60 + 40,
+}
+SLOT_ORDER = ("morning", "noon", "evening", "night")
+CONTENT_MODES = ("seq", "mixNewReview", "preferUnlearned", "preferSaved")
+MAX_TIMES = 5
+DAY_MINUTES = 24 * 60
+
+# 預設值與 PushConfig.defaults() / GlobalPushSettings.defaults() 相同
+DEFAULT_QUIET = (22 * 60, 8 * 60)
+IOS_SAFE_MAX_SCHEDULED = 60
+
+
+# ---------------------------------------------------------------------------
+# PushScheduler 規則的逐行移植（時間以「當天第幾分鐘」表示）
+# ---------------------------------------------------------------------------
+
+def in_quiet(start, end, t):
+    if start < end:
+        return start <= t < end  # same-day
+    return t >= start or t < end  # crosses midnight
+
+
+def resolve_times(time_mode, preset_slots, custom_times):
+    if time_mode == "custom" and custom_times:
+        return sorted(custom_times)[:MAX_TIMES]
+    slots = preset_slots or ["night"]
+    return sorted(PRESET_SLOT_TIMES.get(s, PRESET_SLOT_TIMES["night"]) for s in slots)[:MAX_TIMES]
+
+
+def apply_freq(times, freq):
+    freq = min(max(freq, 1), 5)
+    if not times:
+        return [PRESET_SLOT_TIMES["night"]]
+    if freq <= len(times):
+        return times[:freq]
+
+    base = list(times)
+    while len(base) < freq:
+        for k in SLOT_ORDER:
+            t = PRESET_SLOT_TIMES[k]
+            if t not in base:
+                base.append(t)
+                break
+        if len(base) >= freq:
+            break
+        base.append((base[-1] + 120) % DAY_MINUTES)
+    return sorted(base)[:MAX_TIMES]
+
+
+def enforce_min_interval(dts, min_interval):
+    if len(dts) <= 1:
+        return dts
+    out = []
+    last = None
+    for t in dts:
+        if last is None or t - last >= min_interval:
+            out.append(t)
+            last = t
+        else:
+            # 往後推可能超過午夜，仍算在當天排程內（分鐘數 >= 1440）
+            last = last + min_interval
+            out.append(last)
+    return out
+
+
+def day_times(time_mode, preset_slots, custom_times, freq, prod_quiet, global_quiet, min_interval):
+    """某一產品設定在一天內的推播時間（尚未套用星期、每日上限）"""
+    times = apply_freq(resolve_times(time_mode, preset_slots, custom_times), freq)
+    filtered = [t for t in times if not (in_quiet(*global_quiet, t) or in_quiet(*prod_quiet, t))]
+    if not filtered:
+        return []
+    return enforce_min_interval(sorted(filtered), min_interval)[:MAX_TIMES]
+
+
+def priority(is_favorite, has_last_opened, purchased_at_ms):
+    score = 0
+    if is_favorite:
+        score += 1000
+    if has_last_opened:
+        score += 200
+    return score + purchased_at_ms // 100000000
+
+
+# ---------------------------------------------------------------------------
+# 合成母體
+# ---------------------------------------------------------------------------
+
+def slot_mask_to_list(mask):
+    return [s for bit, s in enumerate(SLOT_ORDER) if mask >> bit & 1]
+
+
+def synth_population(users, products, rng, products_per_user=3.0, custom_pool=500):
+    """產生母體：每列是一個 (使用者, 已購產品) 的 library 設定，以 dict of arrays 表示"""
+    counts = np.maximum(1, rng.poisson(products_per_user, users))
+    n = int(counts.sum())
+    user = np.repeat(np.arange(users, dtype=np.int64), counts)
+
+    # 熱門產品較多人買（Zipf）
+    weights = 1.0 / np.arange(1, products + 1)
+    product = rng.choice(products, size=n, p=weights / weights.sum())
+
+    # 自訂時間多半集中在整點 / 半點附近，用有限的組合池模擬
+    pool = []
+    for _ in range(custom_pool):
+        k = int(rng.integers(1, MAX_TIMES + 1))
+        pool.append(sorted({int(m) for m in rng.integers(6 * 12, 24 * 12, k) * 5}))
+
+    quiet_choices = np.array([DEFAULT_QUIET, (23 * 60, 7 * 60), (21 * 60, 9 * 60), (0, 6 * 60)])
+    prod_quiet = quiet_choices[rng.choice(len(quiet_choices), n, p=[0.85, 0.07, 0.05, 0.03])]
+    global_quiet = quiet_choices[rng.choice(len(quiet_choices), users, p=[0.9, 0.05, 0.03, 0.02])]
+
+    weekdays = 0b0011111
+    all_days = 0b1111111
+    now_ms = 1_700_000_000_000
+
+    return {
+        "users": users,
+        "user": user,
+        "product": product,
+        "push_enabled": rng.random(n) < 0.7,
+        "is_hidden": rng.random(n) < 0.05,
+        "is_favorite": rng.random(n) < 0.2,
+        "has_last_opened": rng.random(n) < 0.6,
+        "purchased_at_ms": now_ms - rng.integers(0, 180 * 86400 * 1000, n),
+        "freq": rng.choice([1, 2, 3, 4, 5], n, p=[0.5, 0.25, 0.15, 0.05, 0.05]),
+        "custom": rng.random(n) < 0.2,
+        "slot_mask": rng.integers(0, 16, n),  # 0 = 沒選，等同 ['night']
+        "custom_idx": rng.integers(0, custom_pool, n),
+        "custom_pool": pool,
+        "days_mask": np.where(rng.random(n) < 0.8, all_days, weekdays),
+        "prod_quiet_start": prod_quiet[:, 0],
+        "prod_quiet_end": prod_quiet[:, 1],
+        "min_interval": rng.choice([30, 60, 120, 180], n, p=[0.1, 0.2, 0.6, 0.1]),
+        "content_mode": rng.choice(len(CONTENT_MODES), n, p=[0.6, 0.2, 0.1, 0.1]),
+        "global_enabled": rng.random(users) < 0.95,
+        "daily_cap": rng.choice([3, 5, 8, 12, 20], users, p=[0.1, 0.2, 0.5, 0.15, 0.05]),
+        "global_quiet_start": global_quiet[:, 0],
+        "global_quiet_end": global_quiet[:, 1],
+        "global_days_mask": np.full(users, all_days),
+    }
+
+
+# 每個 library 項目一列的欄位（其餘為每位使用者一列或共用資料）
+ROW_FIELDS = (
+    "user", "product", "push_enabled", "is_hidden", "is_favorite", "has_last_opened", "purchased_at_ms",
+    "freq", "custom", "slot_mask", "custom_idx", "days_mask", "prod_quiet_start", "prod_quiet_end",
+    "min_interval", "content_mode",
+)
+
+
+# ---------------------------------------------------------------------------
+# 內容量：每個產品能連續推幾天
+# ---------------------------------------------------------------------------
+
+def content_days(seqs):
+    """回傳 (seq 從 1 開始連續的長度, item 數)
+
+    seq / preferSaved / mixNewReview 依 nextSeq 取卡，遇到缺號就回到第一則；
+    preferUnlearned 依排序取第一則未學過的，可以推完所有 item。
+    """
+    present = set(seqs)
+    run = 0
+    while run + 1 in present:
+        run += 1
+    return run, len(seqs)
+
+
+def catalog_content(path):
+    """path 可以是 xlsx 或編譯後的 catalog；編譯後的只讀 productId / seq 兩欄"""
+    if os.path.isdir(path):
+        from compile_catalog import read_manifest, read_table
+        if read_manifest(path)["entities"]["content_items"]["rows"]:
+            table = read_table(path, "content_items", columns=["productId", "seq"])
+            pairs = zip(table["productId"].to_pylist(), table["seq"].to_pylist())
+        else:
+            pairs = []
+    else:
+        from upload_v3_excel import load_source
+        items = load_source(path, quarantine=[])["content_items"].values()
+        pairs = ((data["productId"], data["seq"]) for data in items)
+    by_product = {}
+    for pid, seq in pairs:
+        by_product.setdefault(pid, []).append(seq)
+    names = sorted(by_product)
+    return names, [content_days(by_product[p]) for p in names]
+
+
+def synth_content(products, items_per_product, rng):
+    names = [f"product_{i:04d}" for i in range(products)]
+    sizes = np.maximum(1, rng.poisson(items_per_product, products))
+    return names, [(int(s), int(s)) for s in sizes]
+
+
+# ---------------------------------------------------------------------------
+# 模擬
+# ---------------------------------------------------------------------------
+
+def config_times(pop):
+    """母體設定去重後逐一套用 Dart 規則，回傳每列的時段矩陣（-1 表示空位）"""
+    user = pop["user"]
+    columns = np.stack([
+        pop["custom"].astype(np.int64),
+        pop["slot_mask"],
+        np.where(pop["custom"], pop["custom_idx"], -1),
+        pop["freq"],
+        pop["prod_quiet_start"],
+        pop["prod_quiet_end"],
+        pop["global_quiet_start"][user],
+        pop["global_quiet_end"][user],
+        pop["min_interval"],
+    ], axis=1)
+    # np.unique(axis=0) 在百萬列上很慢：先把每欄編碼成小整數，再組成單一 int64 key
+    key = np.zeros(len(columns), dtype=np.int64)
+    for col in columns.T:
+        levels, codes = np.unique(col, return_inverse=True)
+        key = key * len(levels) + codes
+        if key.max(initial=0) > 2**40:
+            key = np.unique(key, return_inverse=True)[1].astype(np.int64)
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    configs = columns[first]
+
+    table = np.full((len(configs), MAX_TIMES), -1, dtype=np.int32)
+    for i, (custom, mask, cidx, freq, pqs, pqe, gqs, gqe, interval) in enumerate(configs.tolist()):
+        times = day_times(
+            "custom" if custom else "preset",
+            slot_mask_to_list(mask),
+            pop["custom_pool"][cidx] if cidx >= 0 else [],
+            freq, (pqs, pqe), (gqs, gqe), interval,
+        )
+        table[i, :len(times)] = times
+    return table[inverse.ravel()], len(configs)
+
+
+def simulate(pop, content, days, start_weekday=1, now_minute=0):
+    """逐日模擬；回傳每分鐘推播數、每日推播數與每列內容用完的日子（-1 = 沒用完）"""
+    user = pop["user"]
+    n = len(user)
+    times, unique_configs = config_times(pop)
+
+    seq_run = np.array([c[0] for c in content], dtype=np.int64)
+    item_count = np.array([c[1] for c in content], dtype=np.int64)
+    unlearned = pop["content_mode"] == CONTENT_MODES.index("preferUnlearned")
+    usable = np.where(unlearned, item_count[pop["product"]], seq_run[pop["product"]])
+
+    active = (
+        pop["push_enabled"] & ~pop["is_hidden"] & pop["global_enabled"][user]
+        & (item_count[pop["product"]] > 0)  # 沒有內容時 _pickItem 回傳 null
+    )
+    days_mask = pop["days_mask"] & pop["global_days_mask"][user]
+    prio = (
+        pop["is_favorite"] * 1000 + pop["has_last_opened"] * 200 + pop["purchased_at_ms"] // 100000000
+    )
+    cap = np.clip(pop["daily_cap"], 1, 50)
+
+    # minIntervalMinutes 最多可把 5 個時段各往後推一天，預留空間
+    per_minute = np.zeros((days + MAX_TIMES) * DAY_MINUTES, dtype=np.int64)
+    per_day = np.zeros(days, dtype=np.int64)
+    delivered_days = np.zeros(n, dtype=np.int64)
+    exhausted_on = np.full(n, -1, dtype=np.int64)
+
+    def schedule_day(weekday, first_day):
+        """某個星期幾（第一天另外套用 now）會排出的推播：回傳 (每分鐘數量, 有推播的列)"""
+        eligible = active & (days_mask >> weekday & 1).astype(bool)
+        slots = (times >= 0) & eligible[:, None]
+        if first_day:
+            slots &= times >= now_minute + 1
+        rows, cols = np.nonzero(slots)
+        when = times[rows, cols].astype(np.int64)
+        owner = user[rows]
+
+        # 全域每日上限：依優先分數高到低、時間早到晚取前 cap 則
+        order = np.lexsort((when, -prio[rows], owner))
+        rows, when, owner = rows[order], when[order], owner[order]
+        first = np.r_[0, np.flatnonzero(owner[1:] != owner[:-1]) + 1]
+        group_start = np.repeat(first, np.diff(np.r_[first, len(owner)]))
+        keep = (np.arange(len(owner)) - group_start) < cap[owner]
+        rows, when = rows[keep], when[keep]
+
+        pushed = np.zeros(n, dtype=bool)
+        pushed[rows] = True
+        return np.bincount(when, minlength=MAX_TIMES * DAY_MINUTES), pushed
+
+    # 設定不隨日期改變，排程只跟星期幾有關：每種星期幾只算一次
+    schedules = {}
+    for day in range(days):
+        weekday = (start_weekday - 1 + day) % 7  # 0 = 星期一
+        key = (weekday, day == 0)
+        if key not in schedules:
+            schedules[key] = schedule_day(weekday, day == 0)
+        counts, pushed = schedules[key]
+
+        per_minute[day * DAY_MINUTES:day * DAY_MINUTES + len(counts)] += counts
+        per_day[day] = counts.sum()
+
+        delivered_days += pushed
+        newly = pushed & (exhausted_on < 0) & (delivered_days >= usable)
+        exhausted_on[newly] = day + 1
+
+    return {
+        "per_minute": per_minute,
+        "per_day": per_day,
+        "exhausted_on": exhausted_on,
+        "active": active,
+        "unique_configs": unique_configs,
+    }
+
+
+def build_schedule_reference(pop, content, u, days, start_weekday=1, now_minute=0):
+    """單一使用者的 buildSchedule（不向量化），用來核對 simulate 的結果"""
+    user = pop["user"]
+    rows = np.flatnonzero(user == u)
+    if not pop["global_enabled"][u]:
+        return [0] * days
+    counts = []
+    for day in range(days):
+        weekday = (start_weekday - 1 + day) % 7
+        candidates = []
+        for r in rows:
+            if pop["is_hidden"][r] or not pop["push_enabled"][r]:
+                continue
+            if not (pop["global_days_mask"][u] >> weekday & 1 and pop["days_mask"][r] >> weekday & 1):
+                continue
+            if content[pop["product"][r]][1] == 0:
+                continue
+            times = day_times(
+                "custom" if pop["custom"][r] else "preset",
+                slot_mask_to_list(int(pop["slot_mask"][r])),
+                pop["custom_pool"][pop["custom_idx"][r]],
+                int(pop["freq"][r]),
+                (int(pop["prod_quiet_start"][r]), int(pop["prod_quiet_end"][r])),
+                (int(pop["global_quiet_start"][u]), int(pop["global_quiet_end"][u])),
+                int(pop["min_interval"][r]),
+            )
+            for t in times:
+                if day == 0 and t < now_minute + 1:
+                    continue
+                candidates.append((t, r))
+        cap = min(max(int(pop["daily_cap"][u]), 1), 50)
+        if len(candidates) > cap:
+            candidates.sort(key=lambda c: (-priority(pop["is_favorite"][c[1]], pop["has_last_opened"][c[1]],
+                                                     int(pop["purchased_at_ms"][c[1]])), c[0]))
+            candidates = candidates[:cap]
+        counts.append(min(len(candidates), IOS_SAFE_MAX_SCHEDULED))
+    return counts
+
+
+def verify(pop, content, days, sample, rng, start_weekday, now_minute):
+    """抽樣使用者，比對向量化結果與逐行移植的排程數量"""
+    users = rng.choice(pop["users"], size=min(sample, pop["users"]), replace=False)
+    sub = np.isin(pop["user"], users)
+    small = {k: (v[sub] if k in ROW_FIELDS else v) for k, v in pop.items()}
+    result = simulate(small, content, days, start_weekday, now_minute)
+    expected = np.zeros(days, dtype=np.int64)
+    for u in users:
+        expected += build_schedule_reference(pop, content, u, days, start_weekday, now_minute)
+    return np.array_equal(expected, result["per_day"]), expected, result["per_day"]
+
+
+def fmt_minute(m):
+    return f"{m // 60:02d}:{m % 60:02d}"
+
+
+def print_report(result, pop, names, content, days, top):
+    per_minute = result["per_minute"]
+    total = int(per_minute.sum())
+    busy = per_minute[per_minute > 0]
+    print(f"\n📨 推播總數: {total:,}（{days} 天，平均每天 {total / days:,.0f}）")
+    print(f"   每分鐘: 平均 {total / (days * DAY_MINUTES):,.1f}，有推播的分鐘平均 {busy.mean() if len(busy) else 0:,.1f}")
+    peak = int(per_minute.argmax())
+    print(f"   尖峰: 第 {peak // DAY_MINUTES + 1} 天 {fmt_minute(peak % DAY_MINUTES)}，{int(per_minute[peak]):,} 則/分鐘")
+
+    by_slot = per_minute[:days * DAY_MINUTES].reshape(days, DAY_MINUTES).sum(axis=0) / days
+    print(f"\n⏰ 最繁忙的時段（每天平均）:")
+    for m in np.argsort(by_slot)[::-1][:top]:
+        print(f"   {fmt_minute(int(m))}  {by_slot[m]:,.0f} 則")
+
+    exhausted_on = result["exhausted_on"]
+    active = result["active"]
+    print(f"\n📚 內容用完的天數（推播中的 library 項目）:")
+    print(f"   {'productId':<24} {'訂閱':>9} {'可推天數':>8} {'已用完':>7} {'中位數':>6} {'p10':>5}")
+    product = pop["product"]
+    counts = np.bincount(product[active], minlength=len(names))
+    for p in np.argsort(counts)[::-1][:top]:
+        rows = active & (product == p)
+        done = exhausted_on[rows]
+        done = done[done > 0]
+        ratio = len(done) / max(1, int(rows.sum()))
+        median = f"{np.median(done):.0f}" if len(done) else "-"
+        p10 = f"{np.percentile(done, 10):.0f}" if len(done) else "-"
+        print(f"   {names[p]:<24} {int(rows.sum()):>9,} {content[p][0]:>8} {ratio:>7.0%} {median:>6} {p10:>5}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="模擬 PushScheduler 的推播量與內容消耗速度")
+    ap.add_argument("--users", type=int, default=100000, help="synthetic users")
+    ap.add_argument("--days", type=int, default=30, help="days to simulate")
+    ap.add_argument("--excel", help="take products and seq numbering from this workbook (or compiled catalog) instead of synthetic content")
+    ap.add_argument("--products", type=int, default=50, help="synthetic products (without --excel)")
+    ap.add_argument("--items-per-product", type=int, default=30, help="mean synthetic items per product (without --excel)")
+    ap.add_argument("--products-per-user", type=float, default=3.0, help="mean library size per user")
+    ap.add_argument("--start-weekday", type=int, default=1, choices=range(1, 8), help="weekday of day 1 (1 = Monday)")
+    ap.add_argument("--now", default="00:00", help="time of day the app reschedules (HH:MM)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--top", type=int, default=10, help="rows to show in each report section")
+    ap.add_argument("--per-minute-csv", help="write pushes per absolute minute to this csv path")
+    ap.add_argument("--verify", type=int, default=0, help="cross-check this many users against the unvectorised port")
+    args = ap.parse_args(argv)
+
+    hh, mm = args.now.split(":")
+    now_minute = int(hh) * 60 + int(mm)
+    rng = np.random.default_rng(args.seed)
+
+    if args.excel:
+        names, content = catalog_content(args.excel)
+        if not names:
+            print(f"❌ 錯誤: {args.excel} 沒有 CONTENT_ITEMS")
+            return 1
+    else:
+        names, content = synth_content(args.products, args.items_per_product, rng)
+
+    started = time.monotonic()
+    pop = synth_population(args.users, len(names), rng, args.products_per_user)
+    result = simulate(pop, content, args.days, args.start_weekday, now_minute)
+    elapsed = time.monotonic() - started
+    print(f"✅ 模擬 {args.users:,} 位使用者 / {len(pop['user']):,} 個 library 項目 / {args.days} 天"
+          f"（{result['unique_configs']:,} 種設定，{elapsed:.1f}s）")
+
+    print_report(result, pop, names, content, args.days, args.top)
+
+    if args.per_minute_csv:
+        with open(args.per_minute_csv, "w", encoding="utf-8") as f:
+            f.write("day,time,pushes\n")
+            for m, count in enumerate(result["per_minute"].tolist()):
+                if count:
+                    f.write(f"{m // DAY_MINUTES + 1},{fmt_minute(m % DAY_MINUTES)},{count}\n")
+        print(f"\n📝 每分鐘推播數: {args.per_minute_csv}")
+
+    if args.verify:
+        ok, expected, actual = verify(pop, content, args.days, args.verify, rng, args.start_weekday, now_minute)
+        if not ok:
+            print(f"\n❌ 抽樣 {args.verify} 位使用者與逐行移植結果不一致")
+            print(f"   expected: {expected.tolist()}")
+            print(f"   actual:   {actual.tolist()}")
+            return 1
+        print(f"\n✅ 抽樣 {args.verify} 位使用者與逐行移植結果一致")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
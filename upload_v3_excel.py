@@ -1,7 +1,8 @@
 import argparse
+import csv
+import os
+import sys
 import pandas as pd
-import firebase_admin
-from firebase_admin import credentials, firestore
 
 def split_semicolon(s):
     if pd.isna(s) or s is None: return []
@@ -15,69 +16,140 @@ def to_bool(v):
     if pd.isna(v): return False
     return str(v).strip().lower() in ("true", "1", "yes", "y")
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--key", required=True, help="service account json path")
-    ap.add_argument("--excel", required=True, help="xlsx path")
-    args = ap.parse_args()
+# convert_ints 中標記「必填、沒有預設值」的整數欄位
+REQUIRED = object()
+
+def to_int(v):
+    """轉成整數；非數字或帶小數的值丟出 ValueError"""
+    if isinstance(v, bool):
+        raise ValueError("不是整數")
+    try:
+        return int(v) if isinstance(v, int) else int(str(v).strip())
+    except ValueError:
+        pass
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        raise ValueError("不是數字")
+    if not f.is_integer():
+        raise ValueError("不是整數")
+    return int(f)
+
+def convert_ints(sheet, idx, r, defaults, quarantine):
+    """轉換一列中的整數欄位（{欄位: 預設值}）
+
+    轉換失敗不丟例外，而是把 (sheet, 列號, 欄位, 原始值, 原因) 記到 quarantine，
+    並回傳 None 讓呼叫端略過整列；同一列的所有錯誤都會一起記錄。
+    """
+    values = {}
+    errors = []
+    for col, default in defaults.items():
+        raw = r.get(col)
+        if pd.isna(raw):
+            if default is REQUIRED:
+                errors.append((col, raw, "必填欄位為空"))
+            else:
+                values[col] = default
+            continue
+        try:
+            values[col] = to_int(raw)
+        except ValueError as e:
+            errors.append((col, raw, str(e)))
+    if errors:
+        for col, raw, reason in errors:
+            quarantine.append({
+                "sheet": sheet,
+                "row": idx + 2,  # Excel 列號：第 1 列是標題
+                "column": col,
+                "value": "" if pd.isna(raw) else str(raw),
+                "reason": reason,
+            })
+        return None
+    return values
+
+# catalog 中每個集合的 key（UI_SEGMENTS 另存於 "segments"，上傳時組成 ui/segments_v1）
+COLLECTIONS = ("topics", "products", "featured_lists", "content_items")
+
+def empty_catalog():
+    catalog = {"segments": {}}
+    for name in COLLECTIONS:
+        catalog[name] = {}
+    return catalog
+
+# 本機 Firestore 模擬器使用的預設 project id
+EMULATOR_PROJECT = "learningbubbles-4ffc2"
 
-    cred = credentials.Certificate(args.key)
+def connect_firestore(key=None, emulator=None, project=None):
+    """連線 Firestore；指定 emulator（host:port）時改連本機模擬器，不需要金鑰"""
+    # firebase_admin 載入很慢，只有真的要連線時才 import
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    if emulator:
+        os.environ["FIRESTORE_EMULATOR_HOST"] = emulator
+        return firestore.Client(project=project or EMULATOR_PROJECT)
+    cred = credentials.Certificate(key)
     firebase_admin.initialize_app(cred)
-    db = firestore.client()
+    return firestore.client()
 
-    xlsx = args.excel
+def commit_in_batches(db, writes, batch_size=450):
+    """Firestore 一次 batch 上限 500，保守用 450"""
+    for i in range(0, len(writes), batch_size):
+        b = db.batch()
+        for fn in writes[i:i+batch_size]:
+            fn(b)
+        b.commit()
 
-    # 1) UI_SEGMENTS -> ui/segments_v1
-    seg_df = pd.read_excel(xlsx, sheet_name="UI_SEGMENTS")
-    segments = []
-    for _, r in seg_df.iterrows():
-        segments.append({
+# 1) UI_SEGMENTS -> ui/segments_v1
+def parse_segments(df, quarantine):
+    docs = {}
+    for idx, r in df.iterrows():
+        ints = convert_ints("UI_SEGMENTS", idx, r, {"order": REQUIRED}, quarantine)
+        if ints is None:
+            continue
+        seg = {
             "id": str(r["segmentId"]).strip(),
             "title": str(r["title"]).strip(),
-            "order": int(r["order"]),
+            "order": ints["order"],
             "mode": str(r["mode"]).strip(),
             "tag": none_if_nan(r.get("tag")),
             "published": to_bool(r["published"]),
-        })
-    segments = [s for s in segments if s["published"]]
-    segments.sort(key=lambda x: x["order"])
-    # 只有在有資料時才更新，避免空值覆蓋現有資料
-    if segments:
-        db.collection("ui").document("segments_v1").set({"segments": segments}, merge=True)
-        print(f"✅ UI_SEGMENTS: 已更新 {len(segments)} 筆區段")
-    else:
-        print("⏭️  UI_SEGMENTS: 工作表為空，跳過更新（保留現有資料）")
+        }
+        if seg["published"]:
+            docs[seg["id"]] = seg
+    return docs
 
-    # helper: batched writes (<=500 per batch)
-    def commit_in_batches(writes, batch_size=450):
-        for i in range(0, len(writes), batch_size):
-            b = db.batch()
-            for fn in writes[i:i+batch_size]:
-                fn(b)
-            b.commit()
-
-    # 2) TOPICS -> topics/{topicId}
-    topics_df = pd.read_excel(xlsx, sheet_name="TOPICS")
-    topic_writes = []
-    for _, r in topics_df.iterrows():
+# 2) TOPICS -> topics/{topicId}
+def parse_topics(df, quarantine):
+    docs = {}
+    for idx, r in df.iterrows():
+        ints = convert_ints("TOPICS", idx, r, {"order": REQUIRED}, quarantine)
+        if ints is None:
+            continue
         tid = str(r["topicId"]).strip()
-        data = {
+        docs[tid] = {
             "title": str(r["title"]).strip(),
             "published": to_bool(r["published"]),
-            "order": int(r["order"]),
+            "order": ints["order"],
             "tags": split_semicolon(r.get("tags")),
             "bubbleImageUrl": none_if_nan(r.get("bubbleImageUrl")),
             "bubbleStorageFile": none_if_nan(r.get("bubbleStorageFile")),
             "bubbleGradStart": none_if_nan(r.get("bubbleGradStart")),
             "bubbleGradEnd": none_if_nan(r.get("bubbleGradEnd")),
         }
-        topic_writes.append(lambda b, tid=tid, data=data: b.set(db.collection("topics").document(tid), data, merge=True))
-    commit_in_batches(topic_writes)
+    return docs
 
-    # 3) PRODUCTS -> products/{productId}
-    prod_df = pd.read_excel(xlsx, sheet_name="PRODUCTS")
-    prod_writes = []
-    for _, r in prod_df.iterrows():
+# 3) PRODUCTS -> products/{productId}
+def parse_products(df, quarantine):
+    docs = {}
+    for idx, r in df.iterrows():
+        ints = convert_ints("PRODUCTS", idx, r, {
+            "order": 0,
+            "itemCount": None,
+            "wordCountAvg": None,
+            "trialLimit": 3,
+        }, quarantine)
+        if ints is None:
+            continue
         pid = str(r["productId"]).strip()
         # 生成 title（優先使用 Excel 中的 title，否則使用 topicId + level）
         title = none_if_nan(r.get("title")) or f'{str(r["topicId"]).strip()} {str(r["level"]).strip()}'
@@ -86,9 +158,9 @@ def main():
         if not title_lower:
             title_lower = title.lower().strip()
         # 處理 order 欄位（如果 Excel 中有就使用，沒有就設為 0）
-        order_value = int(r.get("order")) if not pd.isna(r.get("order")) else 0
+        order_value = ints["order"]
         
-        data = {
+        docs[pid] = {
             "type": none_if_nan(r.get("type")),
             "topicId": str(r["topicId"]).strip(),
             "level": str(r["level"]).strip(),
@@ -102,8 +174,8 @@ def main():
             "published": to_bool(r.get("published")),
             "coverImageUrl": none_if_nan(r.get("coverImageUrl")),
             "coverStorageFile": none_if_nan(r.get("coverStorageFile")),
-            "itemCount": int(r.get("itemCount")) if not pd.isna(r.get("itemCount")) else None,
-            "wordCountAvg": int(r.get("wordCountAvg")) if not pd.isna(r.get("wordCountAvg")) else None,
+            "itemCount": ints["itemCount"],
+            "wordCountAvg": ints["wordCountAvg"],
             "pushStrategy": none_if_nan(r.get("pushStrategy")),
             "sourceType": none_if_nan(r.get("sourceType")),
             "source": none_if_nan(r.get("source")),
@@ -117,15 +189,14 @@ def main():
             "spec3Icon": none_if_nan(r.get("spec3Icon")),
             "spec4Icon": none_if_nan(r.get("spec4Icon")),
             "trialMode": none_if_nan(r.get("trialMode")),
-            "trialLimit": int(r.get("trialLimit")) if not pd.isna(r.get("trialLimit")) else 3,
+            "trialLimit": ints["trialLimit"],
         }
-        prod_writes.append(lambda b, pid=pid, data=data: b.set(db.collection("products").document(pid), data, merge=True))
-    commit_in_batches(prod_writes)
+    return docs
 
-    # 4) FEATURED_LISTS -> featured_lists/{listId}
-    fl_df = pd.read_excel(xlsx, sheet_name="FEATURED_LISTS")
-    fl_writes = []
-    for _, r in fl_df.iterrows():
+# 4) FEATURED_LISTS -> featured_lists/{listId}
+def parse_featured_lists(df, quarantine):
+    docs = {}
+    for _, r in df.iterrows():
         lid = str(r["listId"]).strip()
         ids = split_semicolon(r.get("ids"))
         ftype = str(r.get("type")).strip()
@@ -141,15 +212,23 @@ def main():
             data["topicIds"] = ids
         else:
             data["ids"] = ids  # 不確定就保留原始
-        fl_writes.append(lambda b, lid=lid, data=data: b.set(db.collection("featured_lists").document(lid), data, merge=True))
-    commit_in_batches(fl_writes)
+        docs[lid] = data
+    return docs
 
-    # 5) CONTENT_ITEMS -> content_items/{itemId}
-    ci_df = pd.read_excel(xlsx, sheet_name="CONTENT_ITEMS")
-    ci_writes = []
-    for _, r in ci_df.iterrows():
+# 5) CONTENT_ITEMS -> content_items/{itemId}
+def parse_content_items(df, quarantine):
+    docs = {}
+    for idx, r in df.iterrows():
+        ints = convert_ints("CONTENT_ITEMS", idx, r, {
+            "difficulty": 1,
+            "wordCount": None,
+            "pushOrder": None,
+            "seq": 0,
+        }, quarantine)
+        if ints is None:
+            continue
         iid = str(r["itemId"]).strip()
-        data = {
+        docs[iid] = {
             "productId": str(r["productId"]).strip(),
             "type": none_if_nan(r.get("type")),
             "topicId": none_if_nan(r.get("topicId")),
@@ -159,23 +238,221 @@ def main():
             "anchorGroup": none_if_nan(r.get("anchorGroup")),
             "anchor": str(r.get("anchor")).strip() if not pd.isna(r.get("anchor")) else "",
             "intent": str(r.get("intent")).strip() if not pd.isna(r.get("intent")) else "",
-            "difficulty": int(r.get("difficulty")) if not pd.isna(r.get("difficulty")) else 1,
+            "difficulty": ints["difficulty"],
             "content": str(r.get("content")).strip() if not pd.isna(r.get("content")) else "",
-            "wordCount": int(r.get("wordCount")) if not pd.isna(r.get("wordCount")) else None,
+            "wordCount": ints["wordCount"],
             "reusable": to_bool(r.get("reusable")),
             "sourceType": none_if_nan(r.get("sourceType")),
             "source": none_if_nan(r.get("source")),
             "sourceUrl": none_if_nan(r.get("sourceUrl")),
             "version": none_if_nan(r.get("version")),
-            "pushOrder": int(r.get("pushOrder")) if not pd.isna(r.get("pushOrder")) else None,
+            "pushOrder": ints["pushOrder"],
             "storageFile": none_if_nan(r.get("storageFile")),
-            "seq": int(r.get("seq")) if not pd.isna(r.get("seq")) else 0,
+            "seq": ints["seq"],
             "isPreview": to_bool(r.get("isPreview")),
         }
-        ci_writes.append(lambda b, iid=iid, data=data: b.set(db.collection("content_items").document(iid), data, merge=True))
-    commit_in_batches(ci_writes)
+    return docs
+
+# Excel 工作表 -> (catalog key, 解析函式)
+SHEETS = {
+    "UI_SEGMENTS": ("segments", parse_segments),
+    "TOPICS": ("topics", parse_topics),
+    "PRODUCTS": ("products", parse_products),
+    "FEATURED_LISTS": ("featured_lists", parse_featured_lists),
+    "CONTENT_ITEMS": ("content_items", parse_content_items),
+}
+
+def parse_workbook(xlsx, sheets=None, quarantine=None):
+    """讀取 Excel，轉成 {集合: {docId: data}} 的 catalog（不連線 Firestore）
+
+    sheets 可指定只解析部分工作表，其餘集合保持空白。
+    無法轉換的列不會放進 catalog，而是記錄到 quarantine（list）。
+    """
+    if quarantine is None:
+        quarantine = []
+    xls = pd.ExcelFile(xlsx)
+    catalog = empty_catalog()
+    for sheet, (name, parse) in SHEETS.items():
+        if sheets is not None and sheet not in sheets:
+            continue
+        catalog[name] = parse(pd.read_excel(xls, sheet_name=sheet), quarantine)
+    return catalog
+
+def load_source(path, quarantine=None):
+    """path 可以是 xlsx，或 compile_catalog.py 編譯出的資料夾（直接讀取，不解析 Excel）"""
+    if os.path.isdir(path):
+        from compile_catalog import load_catalog
+        return load_catalog(path)
+    return parse_workbook(path, quarantine=quarantine)
+
+# 嵌入產品文件的試讀卡片只保留產品頁需要的欄位
+PREVIEW_FIELDS = ("seq", "anchor", "intent", "difficulty", "content")
+
+def preview_items(items, trial_limit):
+    """items 為 {itemId: data}：isPreview 的 item 依 seq 排序，取前 trialLimit 筆（trialMode = previewFlag）"""
+    chosen = sorted((data["seq"], iid) for iid, data in items.items() if data.get("isPreview"))
+    chosen = chosen[:max(3 if trial_limit is None else trial_limit, 0)]
+    return [dict({"id": iid}, **{f: items[iid].get(f) for f in PREVIEW_FIELDS}) for _, iid in chosen]
+
+def build_previews(catalog):
+    """{productId: [試讀卡片]}，只包含 content_items 中有這個產品內容的產品
+
+    只上傳 PRODUCTS（或 CONTENT_ITEMS 只含部分產品）時無從得知其他產品的試讀卡片，
+    這些產品不會出現在結果中，Firestore 上原本的 previewItems 保持不變。
+    """
+    items = {}
+    for iid, data in catalog["content_items"].items():
+        if data["productId"] in catalog["products"]:
+            items.setdefault(data["productId"], {})[iid] = data
+    return {pid: preview_items(docs, catalog["products"][pid]["trialLimit"]) for pid, docs in items.items()}
+
+def attach_previews(catalog):
+    """在產品文件加上 previewItems，產品頁不必再查詢 content_items
+
+    會換成新的 dict 而不是原地修改，已推送的狀態（watch 模式）才比得出差異；
+    只改 CONTENT_ITEMS 時，試讀卡片有變的產品也會被 diff_catalog 視為變動。
+    """
+    for pid, items in build_previews(catalog).items():
+        catalog["products"][pid] = dict(catalog["products"][pid], previewItems=items)
+    return catalog
+
+def sync_previews(db, content_items, products):
+    """content_items 的產品不在 products 中時（例如只上傳 CONTENT_ITEMS），
+    在上傳之後從 Firestore 讀出該產品的試讀卡片重算，只更新 previewItems 欄位
+
+    products 是這次來源中已經由 attach_previews 處理過的產品 id。
+    """
+    from google.cloud.firestore import FieldFilter
+    pids = sorted({data["productId"] for data in content_items.values()} - set(products))
+    updated = 0
+    for pid in pids:
+        ref = db.collection("products").document(pid)
+        snap = ref.get()
+        if not snap.exists:
+            continue
+        query = (
+            db.collection("content_items")
+            .where(filter=FieldFilter("productId", "==", pid))
+            .where(filter=FieldFilter("isPreview", "==", True))
+        )
+        product = snap.to_dict() or {}
+        items = preview_items({doc.id: doc.to_dict() for doc in query.stream()}, product.get("trialLimit"))
+        if product.get("previewItems") != items:
+            ref.update({"previewItems": items})
+            updated += 1
+    if updated:
+        print(f"✅ 已更新 {updated} 個未在這次上傳中的產品的試讀卡片")
+
+QUARANTINE_FIELDS = ("sheet", "row", "column", "value", "reason")
+
+def write_quarantine_report(quarantine, path):
+    """隔離報告輸出成 CSV（utf-8-sig，Excel 直接開啟不會亂碼）"""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=QUARANTINE_FIELDS)
+        writer.writeheader()
+        writer.writerows(quarantine)
+
+def report_quarantine(quarantine, path, max_errors):
+    """印出隔離摘要並寫出報告；超過錯誤預算時回傳 False"""
+    if not quarantine:
+        return True
+    rows = {(q["sheet"], q["row"]) for q in quarantine}
+    write_quarantine_report(quarantine, path)
+    print(f"⚠️  {len(rows)} 列資料無法轉換，已排除（報告: {path}）")
+    for q in quarantine[:10]:
+        print(f"   {q['sheet']} 第 {q['row']} 列 {q['column']}={q['value']!r}: {q['reason']}")
+    if len(quarantine) > 10:
+        print(f"   ...（共 {len(quarantine)} 個錯誤）")
+    if len(rows) > max_errors:
+        print(f"❌ 錯誤列數 {len(rows)} 超過預算 --max-errors {max_errors}，中止上傳")
+        return False
+    return True
+
+def default_report_path(xlsx):
+    return os.path.splitext(xlsx)[0] + "_quarantine.csv"
+
+def diff_catalog(old, new):
+    """回傳只包含 new 中新增或內容變動文件的 catalog
+
+    ui/segments_v1 是單一文件，任何區段變動時整份區段清單都要重傳。
+    """
+    changed = empty_catalog()
+    if new["segments"] != old["segments"]:
+        changed["segments"] = dict(new["segments"])
+    for name in COLLECTIONS:
+        for doc_id, data in new[name].items():
+            if old[name].get(doc_id) != data:
+                changed[name][doc_id] = data
+    return changed
+
+
+def upload_catalog(db, catalog):
+    """把 parse_workbook 產生的 catalog 寫入 Firestore"""
+    segments = sorted(catalog["segments"].values(), key=lambda x: x["order"])
+    # 只有在有資料時才更新，避免空值覆蓋現有資料
+    if segments:
+        db.collection("ui").document("segments_v1").set({"segments": segments}, merge=True)
+        print(f"✅ UI_SEGMENTS: 已更新 {len(segments)} 筆區段")
+    else:
+        print("⏭️  UI_SEGMENTS: 工作表為空，跳過更新（保留現有資料）")
+
+    for name in COLLECTIONS:
+        writes = []
+        for doc_id, data in catalog[name].items():
+            writes.append(lambda b, name=name, doc_id=doc_id, data=data: b.set(db.collection(name).document(doc_id), data, merge=True))
+        commit_in_batches(db, writes)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--key", help="service account json path")
+    ap.add_argument("--excel", required=True, help="xlsx path or compiled catalog directory")
+    ap.add_argument("--since", help="compiled catalog already in Firestore; only upload documents that differ from it (requires a compiled --excel)")
+    ap.add_argument("--emulator", help="Firestore emulator host:port (no key needed)")
+    ap.add_argument("--max-errors", type=int, default=0, help="abort only if more than this many rows fail to convert")
+    ap.add_argument("--quarantine-report", help="csv path for rows that failed to convert (default: <excel>_quarantine.csv)")
+    ap.add_argument("--dedup-threshold", type=float, help="block the upload when content items are at least this similar")
+    ap.add_argument("--dedup-cache", help="npz file caching MinHash signatures between runs")
+    args = ap.parse_args(argv)
+
+    if not args.key and not args.emulator:
+        ap.error("--key is required unless --emulator is given")
+
+    if args.since and not os.path.isdir(args.excel):
+        ap.error("--since requires --excel to be a compiled catalog directory")
+
+    if args.since:
+        # 比對逐列雜湊，只讀出並上傳與已發布版本不同的文件（編譯時已附上 previewItems）
+        from compile_catalog import changed_catalog, read_manifest
+        catalog, _ = changed_catalog(args.excel, args.since)
+        known_products = read_manifest(args.excel)["entities"]["products"]["rowHashes"]
+        print(f"📊 與 {args.since} 相比有 {sum(len(docs) for docs in catalog.values())} 筆文件需要更新")
+    else:
+        quarantine = []
+        catalog = load_source(args.excel, quarantine)
+        report_path = args.quarantine_report or default_report_path(args.excel)
+        if not report_quarantine(quarantine, report_path, args.max_errors):
+            return 1
+        attach_previews(catalog)
+        known_products = catalog["products"]
+    if args.dedup_threshold is not None:
+        from dedup_content import check_duplicates
+        if args.since:
+            # 要和未變動的已發布內容一起比對；簽章有快取，只有新內容需要計算
+            from compile_catalog import load_catalog
+            items = load_catalog(args.excel, names=["content_items"])["content_items"]
+            changed = set(catalog["content_items"])
+        else:
+            items, changed = catalog["content_items"], None
+        if not check_duplicates(items, args.dedup_threshold, args.dedup_cache, changed):
+            print("❌ 已中止上傳，請合併重複內容或調高 --dedup-threshold")
+            return 1
+
+    db = connect_firestore(args.key, args.emulator)
+
+    upload_catalog(db, catalog)
+    sync_previews(db, catalog["content_items"], known_products)
 
     print("✅ Upload done: UI_SEGMENTS / TOPICS / PRODUCTS / FEATURED_LISTS / CONTENT_ITEMS")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
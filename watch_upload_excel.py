@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from zipfile import BadZipFile
+
+from upload_v3_excel import (
+    SHEETS, COLLECTIONS, attach_previews, connect_firestore, default_report_path, diff_catalog, empty_catalog,
+    parse_workbook, report_quarantine, sync_previews, upload_catalog,
+)
+
+try:
+    # 有安裝 watchdog 時使用 inotify / FSEvents，否則退回輪詢
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# 儲存格引用 sharedStrings 的索引：<c r="A2" t="s"><v>12</v></c>
+SHARED_STRING_CELL = re.compile(rb'<c\b[^>]*\bt="s"[^>]*>\s*<v>(\d+)</v>')
+
+
+def sheet_parts(zf):
+    """從 workbook.xml 與其 rels 找出 {工作表名稱: zip 內 XML 路徑}"""
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    for rel in rels.iter(f"{NS_PKG_REL}Relationship"):
+        target = rel.get("Target")
+        if target.startswith("/"):
+            target = target[1:]
+        elif not target.startswith("xl/"):
+            target = "xl/" + target
+        targets[rel.get("Id")] = target
+
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    parts = {}
+    for sheet in workbook.iter(f"{NS_MAIN}sheet"):
+        parts[sheet.get("name")] = targets[sheet.get(f"{NS_REL}id")]
+    return parts
+
+
+def shared_strings(zf):
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+    root = ET.fromstring(zf.read("xl/sharedStrings.xml"))
+    return ["".join(si.itertext()) for si in root.iter(f"{NS_MAIN}si")]
+
+
+def sheet_fingerprints(xlsx):
+    """計算每個工作表的指紋（工作表 XML + 它引用到的共用字串）
+
+    Excel 存檔時會重寫 sharedStrings.xml，只改字串內容時工作表 XML 可能完全相同，
+    所以要把實際引用到的字串一起算進去，才能只重新解析真的有變動的工作表。
+    """
+    with zipfile.ZipFile(xlsx) as zf:
+        strings = shared_strings(zf)
+        fingerprints = {}
+        for name, part in sheet_parts(zf).items():
+            if name not in SHEETS:
+                continue
+            data = zf.read(part)
+            h = hashlib.sha1(data)
+            for m in SHARED_STRING_CELL.finditer(data):
+                idx = int(m.group(1))
+                if idx < len(strings):
+                    h.update(strings[idx].encode("utf-8"))
+                h.update(b"\0")
+            fingerprints[name] = h.hexdigest()
+    return fingerprints
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        # Excel 存檔時會先刪除再改名，短暫找不到檔案
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def wait_for_change(path, signature, changed, poll_interval):
+    """等到檔案簽章與 signature 不同為止，回傳新的簽章"""
+    while True:
+        changed.wait(poll_interval)
+        changed.clear()
+        current = file_signature(path)
+        if current is not None and current != signature:
+            return current
+
+
+def wait_until_stable(path, signature, debounce):
+    """debounce：存檔後 debounce 秒內沒有再變動才處理"""
+    while True:
+        time.sleep(debounce)
+        current = file_signature(path)
+        if current == signature:
+            return signature
+        if current is not None:
+            signature = current
+
+
+def start_observer(path, changed):
+    """用 watchdog 監看所在資料夾（Excel 以暫存檔改名的方式存檔）"""
+    target = os.path.abspath(path)
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            paths = (getattr(event, "src_path", None), getattr(event, "dest_path", None))
+            if target in (os.path.abspath(p) for p in paths if p):
+                changed.set()
+
+    observer = Observer()
+    observer.schedule(Handler(), os.path.dirname(target) or ".", recursive=False)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+
+def count_docs(catalog):
+    return sum(len(catalog[name]) for name in ("segments",) + COLLECTIONS)
+
+
+def refresh(xlsx, state, fingerprints=None):
+    """重新解析有變動的工作表，回傳需要推送的文件（catalog 格式）"""
+    if fingerprints is None:
+        fingerprints = sheet_fingerprints(xlsx)
+    sheets = {s for s, h in fingerprints.items() if state["fingerprints"].get(s) != h}
+    if not sheets:
+        return sheets, empty_catalog()
+
+    quarantine = []
+    partial = parse_workbook(xlsx, sheets=sheets, quarantine=quarantine)
+    for sheet in sheets:
+        name = SHEETS[sheet][0]
+        state["catalog"][name] = partial[name]
+        state["quarantine"][sheet] = [q for q in quarantine if q["sheet"] == sheet]
+    state["fingerprints"] = fingerprints
+    # 試讀卡片由 PRODUCTS 與 CONTENT_ITEMS 共同決定，任一邊變動都要對完整 catalog 重算
+    attach_previews(state["catalog"])
+    return sheets, diff_catalog(state["pushed"], state["catalog"])
+
+
+def within_budget(state, args):
+    quarantine = [q for sheet in SHEETS for q in state["quarantine"].get(sheet, [])]
+    return report_quarantine(quarantine, args.quarantine_report or default_report_path(args.excel), args.max_errors)
+
+
+def publish(db, state, changed):
+    upload_catalog(db, changed)
+    # 產品不在這份 Excel 中時，試讀卡片要從 Firestore 重算
+    sync_previews(db, changed["content_items"], state["catalog"]["products"])
+    for name, docs in changed.items():
+        if name == "segments":
+            # 區段清單整份重傳；沒有變動時 changed 中是空的，不能覆蓋
+            if docs:
+                state["pushed"]["segments"] = dict(docs)
+        else:
+            state["pushed"][name].update(docs)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--key", help="service account json path")
+    ap.add_argument("--excel", required=True, help="xlsx path")
+    ap.add_argument("--emulator", help="Firestore emulator host:port, e.g. localhost:8080 (no key needed)")
+    ap.add_argument("--debounce", type=float, default=1.0, help="seconds the file must stay unchanged before re-publishing")
+    ap.add_argument("--poll-interval", type=float, default=0.5, help="polling interval when watchdog is unavailable")
+    ap.add_argument("--skip-initial", action="store_true", help="assume Firestore already matches the workbook at startup")
+    ap.add_argument("--max-errors", type=int, default=0, help="skip publishing while more than this many rows fail to convert")
+    ap.add_argument("--quarantine-report", help="csv path for rows that failed to convert (default: <excel>_quarantine.csv)")
+    args = ap.parse_args(argv)
+
+    if not args.key and not args.emulator:
+        ap.error("--key is required unless --emulator is given")
+
+    db = connect_firestore(args.key, args.emulator)
+
+    state = {"fingerprints": {}, "catalog": empty_catalog(), "pushed": empty_catalog(), "quarantine": {}}
+    sheets, changed = refresh(args.excel, state)
+    if args.skip_initial:
+        state["pushed"] = {name: dict(docs) for name, docs in state["catalog"].items()}
+    elif count_docs(changed) and within_budget(state, args):
+        publish(db, state, changed)
+    print(f"✅ 已載入 {args.excel}（{count_docs(state['catalog'])} 筆文件）")
+
+    changed_event = threading.Event()
+    if Observer is not None:
+        start_observer(args.excel, changed_event)
+        print("👀 監看中（watchdog）... Ctrl+C 結束")
+    else:
+        print(f"👀 監看中（每 {args.poll_interval}s 輪詢）... Ctrl+C 結束")
+
+    signature = file_signature(args.excel)
+    try:
+        while True:
+            signature = wait_for_change(args.excel, signature, changed_event, args.poll_interval)
+            signature = wait_until_stable(args.excel, signature, args.debounce)
+            started = time.monotonic()
+            try:
+                fingerprints = sheet_fingerprints(args.excel)
+            except (BadZipFile, KeyError, OSError) as e:
+                # 讀不到 zip 目錄或缺少成員：存檔尚未寫完。清掉簽章，下一輪輪詢即使檔案沒再變動也會重新讀取
+                print(f"⚠️  讀取失敗，稍後重試: {e}")
+                signature = None
+                continue
+            try:
+                sheets, changed = refresh(args.excel, state, fingerprints)
+            except (BadZipFile, OSError) as e:
+                # 解析途中檔案又被替換
+                print(f"⚠️  讀取失敗，稍後重試: {e}")
+                signature = None
+                continue
+            except Exception as e:
+                print(f"❌ 解析失敗（保留上一版狀態，等下一次存檔）: {e}")
+                continue
+
+            if not within_budget(state, args):
+                print("⏭️  修正後存檔會再重新發布")
+                continue
+            if not count_docs(changed):
+                print(f"⏭️  {', '.join(sorted(sheets)) or '無工作表'} 變動，但沒有文件需要更新")
+                continue
+            publish(db, state, changed)
+            elapsed = time.monotonic() - started
+            print(f"✅ {', '.join(sorted(sheets))}: 推送 {count_docs(changed)} 筆文件（{elapsed:.2f}s）")
+    except KeyboardInterrupt:
+        print("\n👋 結束監看")
+
+
+if __name__ == "__main__":
+    main()